@@ -1,4 +1,35 @@
-from .variogram import Variogram
-from .revarie import Revarie
+import importlib
+
 from .fvariogram import *
 from .__version__ import *
+
+#classes and heavy dependencies are only imported on first access, so that
+#importing the package does not pull in scipy or scikit-sparse
+_lazy = {"Variogram" : ".variogram",
+         "GridVariogram" : ".gvariogram",
+         "Revarie" : ".revarie",
+         "GridRevarie" : ".grid",
+         "SGSRevarie" : ".sgs",
+         "TBRevarie" : ".tbands",
+         "FactorCache" : ".cache",
+         "interp1d" : "scipy.interpolate",
+         "curve_fit" : "scipy.optimize"}
+
+#submodules that used to be bound by the eager imports
+_modules = ("revarie", "variogram")
+
+__all__ = sorted({n for n in globals() if not n.startswith("_")} -
+        {"importlib"} | set(_lazy) | set(_modules))
+
+def __getattr__(name):
+    if name in _modules:
+        return importlib.import_module("." + name, __name__)
+    if name not in _lazy:
+        raise AttributeError("module {m!r} has no attribute {n!r}".format(
+            m = __name__, n = name))
+    value = getattr(importlib.import_module(_lazy[name], __name__), name)
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazy) | set(_modules))
@@ -6,6 +6,8 @@ import time
 import datetime
 from .output import write
 from pathlib import Path
+import subprocess
+import sys
 
 def bench_variogram(tlimit = 15, path = "."):
     """
@@ -83,6 +85,27 @@ def bench_revarie(tlimit = 15, path = "."):
         fname = Path("revarie_timing" + str(t).zfill(3) + ".dat")
     write(np.asarray(ns),np.asarray(ts),Path(path) / fname,"Revarie", "1-D")
 
+def bench_import(n = 10):
+    """
+    Run import time benchmark for the revarie package. Every import is timed
+    in a fresh interpreter so module caching does not hide the cost.
+
+    Parameters
+    ----------
+    n : int
+        Number of fresh interpreters to time the import in
+
+    Returns
+    -------
+    t : numpy.ndarray
+        Wall time of each import in seconds
+    """
+    cmd = ("import time; t = time.perf_counter(); import revarie; "
+           "print(time.perf_counter() - t)")
+    t = [float(subprocess.check_output([sys.executable, "-c", cmd]))
+            for _ in range(n)]
+    return np.asarray(t)
+
 def suite(tlimit = 30, path = "."):
     """
     Run timing benchmark test for both the revarie and variogram classes.
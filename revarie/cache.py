@@ -0,0 +1,169 @@
+import numpy as np
+import scipy.sparse as ssp
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+class FactorCache:
+    def __init__(self, path, max_bytes = 2**30):
+        """
+        On-disk cache of cholesky factors used by Revarie. Entries are keyed
+        by a hash of the points, sill, epsilon, factorization options and a
+        fingerprint of the model. Factors are stored as .npy files and loaded
+        memory-mapped, so a cache hit neither factors nor copies the matrix.
+        Least recently used entries are evicted once the cache grows beyond
+        max_bytes.
+
+        Parameters
+        ----------
+        path : str, path-like
+            Directory holding the cache entries, created if missing
+        max_bytes : int
+            Maximum total size of the cache on disk
+        """
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+
+        self.path.mkdir(parents = True, exist_ok = True)
+
+    def key(self, x, sill, epsilon, model, **options):
+        """
+        Calculates the cache key of a factorization
+
+        Parameters
+        ----------
+        x : numpy.ndarray
+            Points the covariance matrix is built on
+        sill : float
+            Spatially-independent variance of field values
+        epsilon : float
+            Perturbation amount used in the factorization
+        model : function
+            Variogram model, fingerprinted by its values on probe lags
+            spanning the domain
+        **options
+            Any other factorization options that change the factor
+
+        Returns
+        -------
+        key : str
+            Hex digest identifying the factorization
+        """
+        x = np.ascontiguousarray(x, dtype = np.float64)
+        xx = x if x.ndim > 1 else x.reshape(x.size, 1)
+        diag = np.sqrt(np.sum((xx.max(axis = 0) - xx.min(axis = 0))**2)) \
+                if xx.size > 0 else 0.
+        probe = np.concatenate(([0.], np.linspace(0, diag, 1025)[1:],
+            np.geomspace(1e-6, 1., 64)*diag))
+        values = np.broadcast_to(np.asarray(model(probe), dtype = np.float64),
+                probe.shape)
+
+        h = hashlib.sha256()
+        h.update(repr(x.shape).encode())
+        h.update(x.tobytes())
+        h.update(np.ascontiguousarray(values).tobytes())
+        h.update(repr((float(sill), float(epsilon),
+            sorted(options.items()))).encode())
+        return h.hexdigest()
+
+    def load(self, key):
+        """
+        Loads a cached factor memory-mapped from disk
+
+        Returns
+        -------
+        chol : numpy.ndarray, scipy.sparse.csc_matrix or None
+            Cached factor, None if there is no entry for key
+        meta : dict or None
+            Extra information stored alongside the factor, including any
+            extra arrays loaded memory-mapped
+        """
+        entry = self.path / key
+        try:
+            meta = json.loads((entry / "meta.json").read_text())
+            if meta["type"] == "sparse":
+                data, indices, indptr = [np.load(str(entry / (f + ".npy")),
+                    mmap_mode = "r") for f in ("data", "indices", "indptr")]
+                chol = ssp.csc_matrix((data, indices, indptr),
+                        shape = tuple(meta["shape"]), copy = False)
+            else:
+                chol = np.load(str(entry / "chol.npy"), mmap_mode = "r")
+            for f in meta.pop("arrays", []):
+                meta[f] = np.load(str(entry / (f + ".npy")), mmap_mode = "r")
+        except (OSError, ValueError, KeyError):
+            return None, None
+
+        os.utime(str(entry))
+        return chol, meta
+
+    def store(self, key, chol, arrays = None, **meta):
+        """
+        Writes a factor to the cache and evicts least recently used entries
+        if the cache is over its size limit. Factors larger than the limit
+        are not stored.
+
+        Parameters
+        ----------
+        key : str
+            Cache key from self.key
+        chol : numpy.ndarray, scipy.sparse matrix
+            Factor to store
+        arrays : dict
+            Extra arrays stored with the factor as .npy files and returned in
+            meta by self.load
+        **meta
+            Extra json-serializable information stored with the factor
+        """
+        tmp = Path(tempfile.mkdtemp(dir = str(self.path), prefix = ".tmp"))
+        try:
+            if ssp.issparse(chol):
+                chol = ssp.csc_matrix(chol)
+                meta.update(type = "sparse", shape = list(chol.shape))
+                for f in ("data", "indices", "indptr"):
+                    np.save(str(tmp / (f + ".npy")), getattr(chol, f))
+            else:
+                meta.update(type = "dense")
+                np.save(str(tmp / "chol.npy"), np.asarray(chol))
+            arrays = {} if arrays is None else arrays
+            for f, a in arrays.items():
+                np.save(str(tmp / (f + ".npy")), np.asarray(a))
+            meta.update(arrays = sorted(arrays))
+            (tmp / "meta.json").write_text(json.dumps(meta))
+
+            if self.size(tmp) > self.max_bytes:
+                return
+            try:
+                os.rename(str(tmp), str(self.path / key))
+            except OSError:
+                return #stored concurrently by another process
+        finally:
+            shutil.rmtree(str(tmp), ignore_errors = True)
+
+        self.evict(keep = key)
+
+    def evict(self, keep = None):
+        """
+        Removes least recently used entries until the cache fits in
+        self.max_bytes
+        """
+        entries = [(e.stat().st_mtime, self.size(e), e) for e in
+                self.path.iterdir() if e.is_dir() and
+                not e.name.startswith(".")]
+        total = sum(e[1] for e in entries)
+
+        for _, size, entry in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if entry.name == keep:
+                continue
+            shutil.rmtree(str(entry), ignore_errors = True)
+            total -= size
+
+    def size(self, entry):
+        """
+        Size of a cache entry on disk in bytes
+        """
+        return sum(f.stat().st_size for f in Path(entry).iterdir())
@@ -1,8 +1,6 @@
 import numpy as np
 import warnings
 from functools import partial, wraps
-from scipy.interpolate import interp1d
-from scipy.optimize import curve_fit
 from .models import * #mtags variable comes from here
 
 def _fvariogram(f):
@@ -166,9 +164,7 @@ def fvariogram(source, methd, options, *args, **kwargs):
                 _f = lambda *a : f(*a[::-1])
                 return partial(_f, *options[1::-1])
         else:
-            f = mtags[methd]
-            _f = lambda *a : f(*a[::-1])
-            return partial(_f, *options[::-1])
+            return _bmodel(methd, options)
 
     elif source == "data":
         h = options[0]
@@ -190,6 +186,7 @@ def interp(h, v, kind, *args, **kwargs):
     """
     See "data" -> "interp" above
     """
+    from scipy.interpolate import interp1d
     return interp1d(h, v, kind, *args, **kwargs)
 
 def polyfit(h, v, order, opt, *args, **kwargs):
@@ -210,17 +207,35 @@ def bmodel_fit(h, v, model, opt, *args, **kwargs):
     """
     See "data" -> "bmodel" above
     """
-    m = mtags[model]
-    return umodel_fit(h, v, m, opt, *args, **kwargs)
+    _, opts = umodel_fit(h, v, mtags[model], True, *args, **kwargs)
+    if opt:
+        return _bmodel(model, opts), opts
+    else:
+        return _bmodel(model, opts)
 
 
 def umodel_fit(h, v, f, opt, *args, **kwargs):
     """
     See "data" -> "umodel" above
     """
+    from scipy.optimize import curve_fit
     opts, _ = curve_fit(f, h, v, *args, **kwargs)
     _f = lambda *a : f(*a[::-1])
     if opt:
         return partial(_f, *opts[::-1]), opts
     else:
         return partial(_f, *opts[::-1])
+
+def _bmodel(tag, params):
+    """
+    Built-in model with parameters filled in. Keyword arguments such as out
+    are passed through, and the covariance variant of the model is attached
+    as the cov attribute so Revarie can skip a separate sill - model(h) pass.
+    """
+    f = mtags[tag]
+    c = ctags[tag]
+    _f = lambda *a, **kw : f(*a[::-1], **kw)
+    _c = lambda *a, **kw : c(*a[::-1], **kw)
+    model = partial(_f, *params[::-1])
+    model.cov = partial(_c, *params[::-1])
+    return model
@@ -0,0 +1,150 @@
+import numpy as np
+
+class GridRevarie:
+    def __init__(self, shape, spacing, mu, sill, model, origin = None,
+            tol = 1e-8, max_pad = 10):
+        """
+        Class to generate random fields on a regular cartesian grid using
+        circulant embedding of the covariance matrix. Field values are drawn
+        with FFTs in O(n log n) time without ever forming the n x n
+        covariance matrix used by Revarie.
+
+        Parameters
+        ----------
+        shape : tuple
+            Number of grid cells in each dimension of the domain
+        spacing : float, tuple
+            Distance between neighboring cell centers. Either a single value
+            used for every dimension or one value per dimension.
+        mu : float
+            Spatially-independent mean of field values
+        sill : float
+            Spatially-independent variance of field values
+        model : function
+            Callable with takes numpy array of lag distances as argument and
+            returns numpy array of variogram values. Should only take a single
+            parameter.
+        origin : tuple
+            Coordinates of the first grid cell, defaults to the origin
+        tol : float
+            Relative tolerance on negative eigenvalues of the circulant
+            embedding. Eigenvalues larger than -tol*max(eigenvalues) are
+            clipped to zero, anything smaller triggers more padding.
+        max_pad : int
+            Maximum number of times the embedding is doubled in size before
+            giving up on finding a non-negative definite embedding
+        """
+        self.shape = tuple(int(a) for a in np.atleast_1d(shape))
+        self.spacing = np.atleast_1d(np.asarray(spacing, dtype=np.float64))
+        if self.spacing.size == 1:
+            self.spacing = np.repeat(self.spacing, len(self.shape))
+        self.mu = mu
+        self.sill = sill
+        self.model = model
+        self.s = int(np.prod(self.shape))
+
+        if origin is None:
+            origin = np.zeros(len(self.shape))
+        self.origin = np.atleast_1d(np.asarray(origin, dtype=np.float64))
+
+        self.check_init()
+
+        self.calc_embedding(tol, max_pad)
+
+    @property
+    def x(self):
+        """
+        Coordinates of grid cells as an array of shape (n, m), ordered the
+        same way as rows of the array returned by genf
+        """
+        axes = [o + d*np.arange(n) for o, d, n in zip(self.origin,
+            self.spacing, self.shape)]
+        grids = np.meshgrid(*axes, indexing = "ij")
+        return np.stack([g.ravel() for g in grids], axis = 1)
+
+    def calc_embedding(self, tol, max_pad):
+        """
+        Finds the smallest circulant embedding (doubling padding as needed)
+        whose eigenvalues are non-negative and stores their scaled square
+        roots for sampling
+        """
+        m = [max(2*(n - 1), 1) for n in self.shape]
+
+        for _ in range(max_pad + 1):
+            lam = np.fft.fftn(self.embed_cov(m)).real
+            if lam.min() >= -tol*lam.max():
+                break
+            m = [2*a if n > 1 else a for a, n in zip(m, self.shape)]
+        else:
+            raise Exception("Could not find non-negative definite circulant "
+                    "embedding, try increasing 'max_pad' or 'tol'")
+
+        self.m = tuple(m)
+        self.sqlam = np.sqrt(np.clip(lam, 0, None)/lam.size)
+
+    def embed_cov(self, m):
+        """
+        Covariance values on the periodic embedding grid of shape m
+        """
+        h2 = 0.
+        for i, (a, d) in enumerate(zip(m, self.spacing)):
+            k = np.arange(a)
+            lag = np.minimum(k, a - k)*d
+            h2 = h2 + (lag**2).reshape([-1 if j == i else 1
+                for j in range(len(m))])
+        h = np.sqrt(h2)
+
+        c = self.sill - np.asarray(self.model(h.ravel()), dtype=np.float64)
+        c = np.broadcast_to(c, (h.size,)).reshape(h.shape).copy()
+        c.flat[0] = self.sill
+        return c
+
+    def genf(self, n=1):
+        """
+        Generates random field values using the circulant embedding
+        calculated previously.
+
+        Parameters
+        ----------
+        n : int
+            Number of fields to be generated
+
+        Returns
+        -------
+        fvs : numpy array
+            Array of field values of shape (dim, n) where each column holds an
+            independently generated field. Each row corresponds to a grid
+            cell, ordered as in self.x.
+        """
+        crop = (slice(None),) + tuple(slice(0, a) for a in self.shape)
+        axes = tuple(range(1, len(self.m) + 1))
+        fvs = np.empty((self.s, n))
+
+        #real and imaginary parts give two independent fields per FFT, a
+        #batch of FFTs is done at once with bounded memory
+        step = max(1, 2**22//int(np.prod(self.m)))
+        for c0 in range(0, (n + 1)//2, step):
+            k = min(step, (n + 1)//2 - c0)
+            eps = np.random.normal(0, 1, (k,) + self.m) + \
+                    1j*np.random.normal(0, 1, (k,) + self.m)
+            y = np.fft.fftn(self.sqlam*eps, axes = axes)[crop]
+            y = np.stack((y.real, y.imag), axis = 1).reshape(2*k, self.s)
+
+            cols = min(2*k, n - 2*c0)
+            fvs[:, 2*c0:2*c0 + cols] = y[:cols].T
+
+        return fvs + self.mu
+
+    def check_init(self):
+        if not callable(self.model):
+            raise Exception("Model initialization parameter must be function"
+                    "which takes numpy array of lags as arg and returns corre"
+                    "sponding variogram values")
+        if len(self.shape) != self.spacing.size:
+            raise Exception("Grid spacing must be given as a single value or"
+                    " one value per dimension")
+        if len(self.shape) != self.origin.size:
+            raise Exception("Grid origin must have one value per dimension")
+        if any(n < 1 for n in self.shape):
+            raise Exception("Grid shape must have at least one cell in every"
+                    " dimension")
@@ -0,0 +1,255 @@
+import numpy as np
+from scipy import fft
+
+from .variogram import Variogram
+
+class GridVariogram(Variogram):
+    """
+
+    Matheron variogram of field values observed on a regular cartesian grid.
+    Sums over point pairs are calculated for every lag vector of the grid at
+    once as FFT cross-correlations, so cost is O(n log n) instead of the
+    O(n^2) of Variogram. Missing cells are handled with indicator masks.
+
+    """
+    def __init__(self, f, spacing = 1., mask = None):
+        """
+        Create variogram and calculate pair counts and sums of squared
+        differences for every lag vector of the grid
+
+        Parameters
+        ----------
+        f : numpy.ndarray
+            Array of field values with one axis per grid dimension. Cells
+            holding nan are treated as missing.
+        spacing : float, tuple
+            Distance between neighboring cell centers. Either a single value
+            used for every dimension or one value per dimension.
+        mask : numpy.ndarray
+            Boolean array shaped like f, True for observed cells. Defaults to
+            all cells that are not nan.
+        """
+        self.f = np.asarray(f, dtype = np.float64)
+        self.spacing = np.atleast_1d(np.asarray(spacing, dtype = np.float64))
+        if self.spacing.size == 1:
+            self.spacing = np.repeat(self.spacing, self.f.ndim)
+        self.mask = ~np.isnan(self.f) if mask is None else \
+                np.asarray(mask, dtype = bool)
+
+        self.check_init()
+
+        self.shape = self.f.shape
+        self.s = int(self.mask.sum())
+        self.dim = self.f.ndim
+        self.stream = False
+        self.max_lag = None
+        self.workers = 1
+        self.block = 2**20
+        self.lags = None
+        self.diffs = None
+        self.pairs = None
+        self.index = None
+        self.acc = None
+        self.buffers = None
+
+        self.calc_maps()
+
+        observed = self.n_map > 0
+        self.range = (self.h[observed].min(), self.h[observed].max()) \
+                if observed.any() else (0., 0.)
+
+        self.reduced = False
+
+    def append(self, x_new, f_new):
+        raise Exception("Observations can not be appended to gridded "
+                "variograms")
+
+    def bootstrap(self, *args, **kwargs):
+        raise Exception("Point pairs are not resampled for gridded "
+                "variograms")
+
+    def reduce(self, *args, **kwargs):
+        raise Exception("Lags of gridded variograms can not be reduced")
+
+    def rreduce(self, *args, **kwargs):
+        raise Exception("Lags of gridded variograms can not be reduced")
+
+    def build_index(self):
+        raise Exception("Gridded variograms are binned from their maps and "
+                "need no sorted lag index")
+
+    def cloud(self):
+        raise Exception("Lags and squared differences of single pairs are not"
+                " calculated for gridded variograms, see self.vmap")
+
+    def calc_maps(self):
+        """
+        Number of pairs and sums of the first and second power of squared
+        differences for every lag vector. Maps have 2*s - 1 entries along an
+        axis of s cells, with the zero lag in the center.
+        """
+        m = self.mask.astype(np.float64)
+        f = np.where(self.mask, self.f, 0.)
+
+        #shift and scale to limit cancellation in the expanded powers
+        mu = f.sum()/max(m.sum(), 1)
+        sd = np.sqrt(np.sum(m*(f - mu)**2)/max(m.sum(), 1))
+        sd = sd if sd > 0 else 1.
+        f = m*(f - mu)/sd
+
+        size = [fft.next_fast_len(2*a - 1, real = True) for a in self.shape]
+        spec = lambda a : fft.rfftn(a, size)
+        corr = lambda a : fft.irfftn(a, size)[self.crop(size)]
+        F = [spec(m), spec(f), spec(f*f)]
+
+        self.n_map = np.rint(corr(np.abs(F[0])**2))
+        self.s1_map = corr(np.conj(F[2])*F[0] + np.conj(F[0])*F[2] -
+                2*np.abs(F[1])**2)*sd**2
+
+        s2 = 6*np.conj(F[2])*F[2]
+        F[2] = spec(f**3)
+        s2 -= 4*(np.conj(F[2])*F[1] + np.conj(F[1])*F[2])
+        F[2] = spec(f**4)
+        s2 += np.conj(F[2])*F[0] + np.conj(F[0])*F[2]
+        self.s2_map = corr(s2)*sd**4
+
+        #zero lag pairs every cell with itself
+        center = tuple(a - 1 for a in self.shape)
+        self.n_map[center] = 0
+        empty = self.n_map <= 0
+        self.n_map[empty] = 0
+        self.s1_map[empty] = 0
+        self.s2_map[empty] = 0
+        np.clip(self.s1_map, 0, None, out = self.s1_map)
+        np.clip(self.s2_map, 0, None, out = self.s2_map)
+
+        self.h = np.sqrt(sum(a**2 for a in self.lag_vectors()))
+
+    def crop(self, size):
+        """
+        Index of lags -(s-1), ..., s-1 along every axis of a padded
+        correlation of shape size
+        """
+        return np.ix_(*[np.r_[m - a + 1:m, 0:a] for a, m in zip(self.shape,
+            size)])
+
+    def lag_axes(self):
+        """
+        Lag coordinates along every axis of the variogram map
+        """
+        return [d*np.arange(1 - a, a) for a, d in zip(self.shape,
+            self.spacing)]
+
+    def lag_vectors(self):
+        """
+        Components of the lag vectors of the variogram map, each broadcast
+        along its own axis
+        """
+        return [a.reshape([-1 if j == i else 1 for j in range(self.dim)])
+                for i, a in enumerate(self.lag_axes())]
+
+    def binstats(self, bins, var = True):
+        """
+        Per-bin number of point pairs, sum and sum of squares of squared
+        differences for given bin boundaries. Every pair appears at lag h
+        and -h of the maps, so sums are halved.
+        """
+        nb = bins.size - 1
+        b_ind = np.digitize(self.h.ravel(), bins)
+        count = lambda w : np.bincount(b_ind, weights = w.ravel(),
+                minlength = nb + 2)[1:nb+1]/2
+
+        n = np.rint(count(self.n_map)).astype(np.intp)
+        return n, count(self.s1_map), count(self.s2_map) if var else None
+
+    def dirstats(self, bins, u, cos_tol, var = True):
+        """
+        Per-direction and per-bin number of point pairs, sum and sum of
+        squares of squared differences from the variogram maps
+        """
+        nb = bins.size - 1
+        b_ind = np.digitize(self.h, bins)
+        acc = [np.zeros((u.shape[0], nb)) for _ in range(3)]
+
+        for d in range(u.shape[0]):
+            proj = sum(a*b for a, b in zip(self.lag_vectors(), u[d]))
+            inside = (np.abs(proj) >= cos_tol*self.h) & (self.h > 0)
+            for a, w in zip(acc, (self.n_map, self.s1_map, self.s2_map)):
+                a[d] = np.bincount(b_ind[inside], weights = w[inside],
+                        minlength = nb + 2)[1:nb+1]/2
+
+        return np.rint(acc[0]).astype(np.intp), acc[1], acc[2] if var else None
+
+    def estats(self, bins, estimators):
+        """
+        Per-bin number of point pairs and sum of squared differences. Only
+        the Matheron estimator can be calculated from the variogram maps.
+        """
+        if any(e != "matheron" for e in estimators):
+            raise Exception("Only the matheron estimator is available for "
+                    "gridded variograms")
+        n, s1, _ = self.binstats(bins, False)
+        return n, {"matheron" : s1}
+
+    def vmap(self, lag = None, nbins = None, var = False):
+        """
+        *Calculate the Matheron variogram map, the semivariance for every lag
+        vector of the grid.
+
+        Parameters
+        ----------
+        lag : float
+            Largest lag along each axis of the map, defaults to the whole
+            map
+        nbins : None
+            Only accepted for the signature of Variogram.vmap, the map has
+            one entry per lag vector of the grid
+        var : bool
+            Set True for the variance of squared differences at every lag
+            vector to be calculated and returned
+
+        Returns
+        -------
+        lags : list
+            Lag coordinates along each axis of the map, from -(s-1) to s-1
+            cells for an axis of s cells
+        n : numpy.ndarray
+            Number of point pairs at each lag vector, symmetric about the
+            center of the map
+        v : numpy.ndarray
+            Estimated semivariance at each lag vector, nan without pairs
+        v_var (optional) : numpy.ndarray
+            Variance associated with squared difference values at each lag
+            vector
+        """
+        if nbins is not None:
+            raise Exception("Gridded variogram maps are not rebinned, they "
+                    "hold every lag vector of the grid")
+        axes = self.lag_axes()
+        crop = (slice(None),)*self.dim
+        if lag is not None:
+            keep = [np.flatnonzero(np.abs(a) <= lag) for a in axes]
+            axes = [a[k] for a, k in zip(axes, keep)]
+            crop = np.ix_(*keep)
+
+        n, s1, s2 = self.n_map[crop], self.s1_map[crop], self.s2_map[crop]
+        with np.errstate(divide = "ignore", invalid = "ignore"):
+            mean = s1/n
+            if var:
+                return axes, n.astype(np.intp), mean/2, s2/n - mean**2
+            return axes, n.astype(np.intp), mean/2
+
+    def check_init(self):
+        """
+        Notify user of errors during initialization of variogram
+        """
+        if self.f.ndim < 1:
+            raise Exception("Field values data (f) must have one axis per grid"
+                    " dimension")
+        if self.spacing.size != self.f.ndim:
+            raise Exception("Grid spacing must be given as a single value or"
+                    " one value per dimension")
+        if self.mask.shape != self.f.shape:
+            raise Exception("Mask must be shaped like the field values")
+        if np.any(np.isnan(self.f[self.mask])):
+            raise Exception("Field values of observed cells can not be nan")
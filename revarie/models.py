@@ -1,17 +1,75 @@
 import numpy as np
 
-def spherical(h, nug, sill, rang):
-    variogram = nug + (sill - nug)*np.piecewise(h, [h <= rang,  h > rang],[lambda h: 1.5*(h/rang)-0.5*(h/rang)**3,1])
-    return variogram
+def _spherical(h, out, scratch, rang):
+    np.divide(h, rang, out=out)
+    np.minimum(out, 1, out=out)
+    np.multiply(out, out, out=scratch)
+    scratch *= -.5
+    scratch += 1.5
+    out *= scratch
 
-def exponential(h, nug, sill, rang):
-    variogram = nug + (sill - nug)*(1.-np.exp(-3*h/rang))
-    return variogram
+def _exponential(h, out, scratch, rang):
+    np.multiply(h, -3/rang, out=out)
+    np.exp(out, out=out)
+    np.subtract(1, out, out=out)
 
-def gaussian(h, nug, sill, rang):
-    variogram =  nug + (sill - nug)*(1.-np.exp(-(2*h/rang)**2))
-    return variogram
+def _gaussian(h, out, scratch, rang):
+    np.multiply(h, 2/rang, out=out)
+    np.square(out, out=out)
+    np.negative(out, out=out)
+    np.exp(out, out=out)
+    np.subtract(1, out, out=out)
+
+def _evaluate(kernel, h, a, b, rang, out, chunk):
+    """
+    Evaluates a + b*g(h) chunk by chunk, where kernel writes the normalized
+    model g into its out argument. Only a scratch buffer of size chunk is
+    allocated, out may be h itself.
+    """
+    h = np.asarray(h)
+    if out is None:
+        out = np.empty(h.shape, dtype=np.result_type(h, 1.))
+    elif not out.flags.c_contiguous or out.shape != h.shape:
+        raise Exception("out must be a C-contiguous array of the same shape"
+                " as the lags")
+
+    hf = h.reshape(-1)
+    of = out.reshape(-1)
+    scratch = np.empty(min(chunk, hf.size), dtype=out.dtype)
+    for i0 in range(0, hf.size, chunk):
+        i1 = min(i0 + chunk, hf.size)
+        o = of[i0:i1]
+        kernel(hf[i0:i1], o, scratch[:i1-i0], rang)
+        o *= b
+        o += a
+    return out
+
+def spherical(h, nug, sill, rang, *, out=None, chunk=2**16):
+    return _evaluate(_spherical, h, nug, sill - nug, rang, out, chunk)
+
+def exponential(h, nug, sill, rang, *, out=None, chunk=2**16):
+    return _evaluate(_exponential, h, nug, sill - nug, rang, out, chunk)
+
+def gaussian(h, nug, sill, rang, *, out=None, chunk=2**16):
+    return _evaluate(_gaussian, h, nug, sill - nug, rang, out, chunk)
+
+#covariance variants give c - model(h) in the same pass, c defaults to sill
+def spherical_cov(h, nug, sill, rang, c=None, *, out=None, chunk=2**16):
+    c = sill if c is None else c
+    return _evaluate(_spherical, h, c - nug, nug - sill, rang, out, chunk)
+
+def exponential_cov(h, nug, sill, rang, c=None, *, out=None, chunk=2**16):
+    c = sill if c is None else c
+    return _evaluate(_exponential, h, c - nug, nug - sill, rang, out, chunk)
+
+def gaussian_cov(h, nug, sill, rang, c=None, *, out=None, chunk=2**16):
+    c = sill if c is None else c
+    return _evaluate(_gaussian, h, c - nug, nug - sill, rang, out, chunk)
 
 mtags = {"sph" : spherical,
         "exp" : exponential,
         "gaus" : gaussian}
+
+ctags = {"sph" : spherical_cov,
+        "exp" : exponential_cov,
+        "gaus" : gaussian_cov}
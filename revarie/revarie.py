@@ -1,20 +1,42 @@
 import numpy as np
-from  scipy.spatial.distance import pdist
+from  scipy.spatial.distance import cdist
+from scipy.linalg import solve_triangular, eigh
+from scipy.linalg.lapack import get_lapack_funcs
+from scipy.sparse.linalg import spsolve_triangular
+from scipy.spatial import cKDTree
 import functools
 import warnings
 import scipy.sparse as ssp
-import sys
+import time
+import importlib
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 
-try:
-    from sksparse.cholmod import cholesky
-except ImportError:
-    pass
+#names of variogram and fvariogram used to be star-imported here, they are
+#now re-exported on first access so that Revarie does not load them
+_reexports = (".fvariogram", ".variogram")
+
+def __getattr__(name):
+    if name == "__all__":
+        names = {n for n in globals() if not n.startswith("_")}
+        for m in _reexports:
+            names |= set(dir(importlib.import_module(m, __package__)))
+        return sorted({n for n in names if not n.startswith("_")} -
+                {"importlib"} | {"interp1d", "curve_fit"})
+    if not name.startswith("_"):
+        for m in _reexports:
+            module = importlib.import_module(m, __package__)
+            if hasattr(module, name):
+                return getattr(module, name)
+        if name in ("interp1d", "curve_fit"):
+            return getattr(importlib.import_module(__package__), name)
+    raise AttributeError("module {m!r} has no attribute {n!r}".format(
+        m = __name__, n = name))
 
-from .variogram import *
-from .fvariogram import *
 
 class Revarie:
-    def __init__(self, x, mu, sill, model, epsilon = 0., sparse = False):
+    def __init__(self, x, mu, sill, model, epsilon = 0., sparse = False,
+            cutoff = None, tol = None, max_rank = None, cache = None,
+            lean = False, dtype = np.float64, robust = False):
         """
         Class to generate random fields based on a variogram given as a
         function in the 'model' parameter, mean and variance for a number of
@@ -37,18 +59,94 @@ class Revarie:
         epsilon : float
             Perturbation amount to supress numerical instabilities in the
             cholesky decomposition
+        sparse : bool
+            Set True to store the covariance matrix and its cholesky
+            decomposition as sparse matrices. Only point pairs closer than
+            the model range are enumerated, which makes this suitable for
+            compact-support models such as spherical. Requires scikit-sparse.
+        cutoff : float
+            Lag distance beyond which the covariance is zero, only used when
+            sparse = True. If not given, it is found by probing the model up
+            to the size of the domain.
+        tol : float
+            Set to use an approximate low-rank factorization from pivoted
+            cholesky instead of the full cholesky decomposition. Pivots are
+            added until the trace of the remaining covariance is below tol
+            times the trace of the covariance matrix, which also bounds its
+            spectral norm. The covariance matrix is never assembled. The rank
+            reached is stored in self.rank and the relative error in
+            self.err.
+        max_rank : int
+            Maximum rank of the low-rank factorization, only used when tol
+            is given
+        cache : FactorCache
+            Opt-in on-disk cache of factorizations. If a factor for the same
+            points, sill, epsilon, model and options is cached, it is loaded
+            memory-mapped and no covariance matrix is assembled (self.cov is
+            None). Otherwise the new factor is stored in the cache.
+        lean : bool
+            Set True to factor the dense covariance matrix in place and drop
+            it afterwards (self.cov is None), halving peak memory
+        dtype : numpy.dtype
+            Floating point type of the dense covariance matrix and its
+            cholesky decomposition. numpy.float32 halves memory again at the
+            cost of precision, usually requiring a larger epsilon.
+        robust : bool
+            Set True to retry a failed cholesky decomposition with growing
+            jitter on the diagonal instead of raising, without assembling the
+            covariance matrix again. See calc_cholesky.
         """
         self.x = x
         self.mu = mu
         self.sill = sill
         self.model = model
         self.sparse = sparse
+        self.cutoff = cutoff
+        self.epsilon = epsilon
+        self.lean = lean
+        self.robust = robust
+        self.dtype = np.dtype(dtype)
         self.s = x.shape[0]
 
         self.check_init()
 
-        self.calc_cov(x, model)
-        self.calc_cholesky(epsilon)
+        if tol is not None and sparse:
+            raise Exception("Low-rank factorization (tol) can not be"
+                    " combined with sparse = True")
+
+        if cache is not None:
+            key = cache.key(x, sill, epsilon, model, sparse = sparse,
+                    cutoff = cutoff, tol = tol, max_rank = max_rank,
+                    dtype = self.dtype.str, robust = robust)
+            self.chol, meta = cache.load(key)
+            if self.chol is not None:
+                self.cov = None
+                if tol is not None:
+                    self.rank, self.err = meta["rank"], meta["err"]
+                else:
+                    self.jitter = meta.get("jitter", epsilon)
+                    self.attempts = [tuple(a) for a in
+                            meta.get("attempts", [])]
+                if "perm" in meta:
+                    self.perm = np.asarray(meta["perm"])
+                return
+
+        if tol is not None:
+            self.cov = None
+            self.calc_lowrank(tol, max_rank, epsilon)
+        else:
+            self.calc_cov(x, model)
+            self.calc_cholesky(epsilon, robust)
+
+        if cache is not None:
+            if tol is not None:
+                meta = {"rank" : self.rank, "err" : self.err}
+            else:
+                meta = {"jitter" : float(self.jitter),
+                        "attempts" : [[m, float(j), float(t)] for m, j, t in
+                            self.attempts]}
+            arrays = {"perm" : self.perm} if sparse else None
+            cache.store(key, self.chol, arrays, **meta)
 
     def calc_cov(self, x, model):
         """
@@ -57,45 +155,333 @@ class Revarie:
         if x.ndim < 2:
             x = x.reshape(x.size, 1)
 
-        ii, jj = np.mask_indices(self.s, np.triu, k=1)
+        if self.sparse:
+            self.cov = self.calc_sparse_cov(x)
+            return
 
-        lags = pdist(x)
-        covariances = self.sill - self.model(lags)
+        #fill upper triangle by row blocks and mirror it, so no pair index
+        #arrays or full-length lag vectors are needed
+        h_cov = np.empty((self.s, self.s), dtype = self.dtype)
+        step = max(1, 2**20//max(self.s, 1))
+        for i0 in range(0, self.s, step):
+            i1 = min(i0 + step, self.s)
+            lags = cdist(x[i0:i1], x[i0:])
+            h_cov[i0:i1, i0:] = self.calc_covariances(lags, out = lags)
+            h_cov[i1:, i0:i1] = h_cov[i0:i1, i1:].T
 
-        if not self.sparse:
-            h_cov = np.zeros((self.s, self.s), dtype = np.float64)
-            h_cov[np.diag_indices(self.s)] = self.sill
-        else:
-            h_cov = ssp.lil_matrix((self.s, self.s), dtype = np.float64)
-            h_cov.setdiag(self.sill)
-            nocorrs = np.isclose(covariances, 0)
-            ii = ii[~nocorrs]
-            jj = jj[~nocorrs]
-            covariances = covariances[~nocorrs]
+        h_cov[np.diag_indices(self.s)] = self.sill
 
-        h_cov[ii, jj] = covariances
-        h_cov[jj, ii] = covariances
+        self.cov = h_cov
 
-        if not self.sparse:
-            self.cov = h_cov
+    def calc_sparse_cov(self, x):
+        """
+        Creates the sparse covariance matrix from the variogram model. Only
+        pairs of points within self.cutoff of each other are visited, so time
+        and memory scale with the number of non-zero entries.
+        """
+        if self.cutoff is None:
+            self.cutoff = self.find_cutoff(x)
+        cutoff = self.cutoff
+
+        pairs = cKDTree(x).query_pairs(cutoff, output_type = "ndarray")
+        ii, jj = pairs[:,0], pairs[:,1]
+
+        lags = np.sqrt(np.sum((x[ii] - x[jj])**2, axis = 1))
+        covariances = self.calc_covariances(lags, out = lags)
+
+        nocorrs = np.isclose(covariances, 0)
+        ii = ii[~nocorrs]
+        jj = jj[~nocorrs]
+        covariances = covariances[~nocorrs]
+
+        diag = np.arange(self.s)
+        rows = np.concatenate((ii, jj, diag))
+        cols = np.concatenate((jj, ii, diag))
+        vals = np.concatenate((covariances, covariances,
+            np.full(self.s, self.sill, dtype = np.float64)))
+
+        return ssp.csc_matrix((vals, (rows, cols)), shape = (self.s, self.s),
+                dtype = np.float64)
+
+    def find_cutoff(self, x, n = 1024):
+        """
+        Estimates the lag distance beyond which the model gives no
+        covariance by evaluating it on n lags spanning the domain bounding
+        box.
+        """
+        diag = np.sqrt(np.sum((x.max(axis = 0) - x.min(axis = 0))**2))
+        probe = np.linspace(0, diag, n + 1)[1:]
+        covariances = self.calc_covariances(probe)
+
+        corrs = np.nonzero(~np.isclose(covariances, 0))[0]
+        if corrs.size == 0:
+            return 0.
+        elif corrs[-1] == n - 1:
+            return diag
         else:
-            self.cov = h_cov.asformat("csc")
+            return probe[corrs[-1] + 1]
 
-    def calc_cholesky(self, epsilon):
+    def calc_cholesky(self, epsilon, robust = False, tries = 8, growth = 10.):
         """
         Generates cholesky decomposition from covariance matrix for efficient
-        random sampling
+        random sampling. With robust = True, a failed factorization is retried
+        on the already assembled matrix with jitter on the diagonal growing
+        geometrically. If every retry fails, a dense matrix falls back to a
+        clipped eigendecomposition. The jitter finally used is stored in
+        self.jitter and every attempt in self.attempts as a tuple of
+        (method, jitter, seconds).
         """
+        self.attempts = []
+        jitters = self.calc_jitters(epsilon, robust, tries, growth)
+
         if not self.sparse:
-            pert = epsilon*np.eye(self.s)
-            self.chol = np.linalg.cholesky(self.cov + pert)
+            self.calc_dense_cholesky(jitters, robust)
         else:
-            if not "sksparse.cholmod" in sys.modules:
-                raise Exception("scikit-sparse is required for sparse = True")
-            pert = ssp.dia_matrix((epsilon*np.ones(self.s),1),
-                       (self.s, self.s))
-            self.chol = cholesky(self.cov + pert).L()
+            self.calc_sparse_cholesky(jitters)
 
+    def calc_jitters(self, epsilon, robust, tries = 8, growth = 10.):
+        """
+        Diagonal jitters tried in turn by a factorization, only epsilon
+        unless robust
+        """
+        jitters = [epsilon]
+        if robust:
+            floor = 1e-10*(abs(self.sill) or 1.)
+            for _ in range(tries):
+                jitters.append(max(jitters[-1]*growth, floor))
+        return jitters
+
+    def calc_dense_cholesky(self, jitters, robust):
+        """
+        Dense factorization for calc_cholesky, done in place on a copy of
+        self.cov or on self.cov itself if self.lean
+        """
+        if self.lean:
+            chol, self.cov = self.cov, None
+        else:
+            chol = self.cov.copy()
+        diag = np.diag_indices(self.s)
+        d = chol[diag].copy()
+
+        potrf, = get_lapack_funcs(("potrf",), (chol,))
+        for jitter in jitters:
+            start = time.perf_counter()
+            chol[diag] = d + jitter
+
+            #symmetric C-ordered matrix is its own fortran-ordered transpose,
+            #so the upper factor of chol.T overwrites the lower triangle of
+            #chol with L and leaves its upper triangle untouched
+            _, info = potrf(chol.T, lower = 0, overwrite_a = 1, clean = 0)
+            self.attempts.append(("cholesky", jitter,
+                time.perf_counter() - start))
+            if info == 0:
+                _zero_upper(chol)
+                self.chol = chol
+                self.jitter = jitter
+                return
+            _mirror_upper(chol)
+
+        if not robust:
+            raise np.linalg.LinAlgError("Matrix is not positive definite")
+
+        start = time.perf_counter()
+        chol[diag] = d + jitters[0]
+        w, v = eigh(chol, overwrite_a = True, check_finite = False)
+        v *= np.sqrt(np.clip(w, 0, None))
+        self.chol = v
+        self.jitter = jitters[0]
+        self.attempts.append(("eigh", jitters[0], time.perf_counter() - start))
+
+    def calc_sparse_cholesky(self, jitters):
+        """
+        Sparse factorization for calc_cholesky with CHOLMOD, which adds the
+        jitter to the diagonal itself
+        """
+        cholmod = _cholmod()
+
+        for jitter in jitters:
+            start = time.perf_counter()
+            try:
+                factor = cholmod.cholesky(self.cov, beta = jitter)
+            except cholmod.CholmodNotPositiveDefiniteError:
+                self.attempts.append(("cholmod", jitter,
+                    time.perf_counter() - start))
+                continue
+            self.attempts.append(("cholmod", jitter,
+                time.perf_counter() - start))
+            #CHOLMOD factors the permuted matrix, undo the fill-reducing
+            #permutation on the rows of L so that chol@chol.T == cov
+            self.perm = factor.P()
+            self.chol = factor.L().tocsr()[np.argsort(self.perm)].tocsc()
+            self.jitter = jitter
+            return
+
+        raise np.linalg.LinAlgError("Matrix is not positive definite")
+
+
+    def add_points(self, x_new, epsilon = None):
+        """
+        Adds points to the field domain by extending the existing cholesky
+        decomposition with a block cholesky step. Only the covariances
+        between new and existing points and the schur complement of the new
+        block are calculated, so adding m points to n costs O(n^2*m) rather
+        than refactoring in O((n+m)^3). Any conditioning set up with
+        condition has to be repeated afterwards.
+
+        Parameters
+        ----------
+        x_new : numpy.ndarray
+            Array of shape (m,n) giving the m new points in the same
+            n-dimensional domain as self.x
+        epsilon : float
+            Perturbation amount added to the diagonal of the new block,
+            defaults to the jitter used for the existing factorization
+        """
+        x_new = np.asarray(x_new, dtype = np.float64)
+        x = self.x if self.x.ndim > 1 else self.x.reshape(self.s, 1)
+        if x_new.ndim < 2:
+            x_new = x_new.reshape(x_new.size, 1)
+        if x_new.shape[1] != x.shape[1]:
+            raise Exception("New points (x_new) must have the same dimension"
+                    " as x")
+        if epsilon is None:
+            epsilon = getattr(self, "jitter", self.epsilon)
+
+        if self.sparse:
+            self.add_sparse_points(x, x_new, epsilon)
+        else:
+            self.add_dense_points(x, x_new, epsilon)
+
+        self.x = np.vstack((x, x_new)) if self.x.ndim > 1 else \
+                np.concatenate((self.x, x_new.ravel()))
+        self.s = self.x.shape[0]
+        self.__dict__.pop("chol_c", None)
+
+    def add_dense_points(self, x, x_new, epsilon):
+        """
+        Dense block cholesky step for add_points
+        """
+        n, m = self.s, x_new.shape[0]
+        if self.chol.shape != (n, n) or not _is_lower(self.chol):
+            raise Exception("Adding points requires a full triangular"
+                    " cholesky factor, not available for tol or after"
+                    " an eigendecomposition fallback")
+
+        c_on = self.calc_cross_cov(x, x_new)
+        c_nn = self.calc_cross_cov(x_new, x_new)
+
+        l21 = solve_triangular(self.chol, c_on, lower = True).T
+        schur = c_nn - l21@l21.T
+        schur[np.diag_indices(m)] += epsilon
+
+        chol = np.zeros((n + m, n + m), dtype = self.chol.dtype)
+        chol[:n,:n] = self.chol
+        chol[n:,:n] = l21
+        chol[n:,n:] = np.linalg.cholesky(schur)
+        self.chol = chol
+
+        if self.cov is not None:
+            cov = np.empty((n + m, n + m), dtype = self.cov.dtype)
+            cov[:n,:n] = self.cov
+            cov[:n,n:] = c_on
+            cov[n:,:n] = c_on.T
+            cov[n:,n:] = c_nn
+            self.cov = cov
+
+    def add_sparse_points(self, x, x_new, epsilon):
+        """
+        Sparse block cholesky step for add_points. The permuted triangular
+        factor L is recovered with self.perm, extended with the factor of
+        the new block and its own fill-reducing permutation, and permuted
+        back.
+        """
+        if not hasattr(self, "perm"):
+            raise Exception("Adding points requires the CHOLMOD permutation"
+                    " of the factor, not stored with this cached factor")
+        cholmod = _cholmod()
+        n = self.s
+
+        c_on = self.calc_sparse_cross_cov(x, x_new)
+        c_nn = self.calc_sparse_cross_cov(x_new, x_new)
+
+        L = self.chol.tocsr()[self.perm]
+        y = spsolve_triangular(L, c_on.tocsr()[self.perm].toarray(),
+                lower = True)
+        schur = c_nn.toarray() - y.T@y
+
+        factor = cholmod.cholesky(ssp.csc_matrix(schur), beta = epsilon)
+        q = factor.P()
+        l21 = y.T[q]
+        l21[np.isclose(l21, 0)] = 0
+
+        L = ssp.bmat([[L, None], [ssp.csr_matrix(l21), factor.L()]],
+                format = "csr")
+        self.perm = np.concatenate((self.perm, n + q))
+        self.chol = L[np.argsort(self.perm)].tocsc()
+
+        if self.cov is not None:
+            self.cov = ssp.bmat([[self.cov, c_on], [c_on.T, c_nn]],
+                    format = "csc")
+
+    def calc_sparse_cross_cov(self, xa, xb):
+        """
+        Creates the sparse covariance matrix between two sets of points,
+        only visiting pairs within self.cutoff of each other
+        """
+        if self.cutoff is None:
+            self.cutoff = self.find_cutoff(np.vstack((xa, xb)))
+
+        near = cKDTree(xa).query_ball_tree(cKDTree(xb), self.cutoff)
+        ii = np.repeat(np.arange(xa.shape[0]), [len(a) for a in near])
+        jj = np.fromiter((j for a in near for j in a), dtype = np.intp,
+                count = ii.size)
+
+        lags = np.sqrt(np.sum((xa[ii] - xb[jj])**2, axis = 1))
+        zero = lags == 0
+        covariances = self.calc_covariances(lags, out = lags)
+        covariances[zero] = self.sill
+
+        keep = ~np.isclose(covariances, 0)
+        return ssp.csc_matrix((covariances[keep], (ii[keep], jj[keep])),
+                shape = (xa.shape[0], xb.shape[0]), dtype = np.float64)
+
+    def calc_lowrank(self, tol, max_rank, epsilon):
+        """
+        Generates an approximate n x r factor of the covariance matrix with
+        pivoted cholesky. Each pivot only requires one column of the
+        covariance matrix, so memory is O(n*r) and time is O(n*r^2).
+        """
+        x = self.x if self.x.ndim > 1 else self.x.reshape(self.s, 1)
+        if max_rank is None:
+            max_rank = self.s
+        max_rank = min(max_rank, self.s)
+
+        d = np.full(self.s, self.sill + epsilon, dtype = np.float64)
+        trace = d.sum()
+        L = np.empty((self.s, min(64, max_rank)), dtype = np.float64,
+                order = "F")
+
+        r = 0
+        while r < max_rank and d.sum() > tol*trace:
+            if r == L.shape[1]:
+                L = np.asfortranarray(np.hstack((L, np.empty((self.s,
+                    min(r, max_rank - r))))))
+            p = np.argmax(d)
+
+            col = self.calc_cross_cov(x, x[p:p+1])[:,0]
+            col[p] += epsilon
+            col -= L[:,:r]@L[p,:r]
+            col /= np.sqrt(d[p])
+
+            L[:,r] = col
+            d -= col**2
+            d[p] = 0
+            np.clip(d, 0, None, out = d)
+            r += 1
+
+        self.chol = L[:,:r]
+        self.rank = r
+        self.err = d.sum()/trace if trace > 0 else 0.
 
     def genf(self, n=1):
         """
@@ -114,9 +500,276 @@ class Revarie:
             independently generated field. Each row corresponds to an field
             point coordinate value.
         """
-        U = np.random.normal(0,1, (self.s, n))
+        U = np.random.normal(0,1, (self.chol.shape[1], n))
         return np.ones((self.s,1))*self.mu + self.chol@U
 
+    def iter_fields(self, total, batch_size = 100, rng = None):
+        """
+        Generates random field values in batches with bounded memory. Work
+        buffers are allocated once and reused for every batch, so peak memory
+        does not depend on the total number of fields.
+
+        Parameters
+        ----------
+        total : int
+            Total number of fields to be generated
+        batch_size : int
+            Maximum number of fields held in memory at once
+        rng : numpy.random.Generator, int
+            Random number generator or seed used to draw fields. Fields only
+            depend on the generator state, not on batch_size.
+
+        Yields
+        ------
+        fvs : numpy array
+            Array of field values of shape (dim, k) with k <= batch_size. The
+            array is overwritten by the next batch, copy it to keep it.
+        """
+        rng = np.random.default_rng(rng)
+        r = self.chol.shape[1]
+        b = max(min(batch_size, total), 1)
+
+        U = np.empty(b*r, dtype = np.float64)
+        F = np.empty(self.s*b, dtype = np.float64)
+
+        for start in range(0, total, b):
+            k = min(b, total - start)
+            #one contiguous row of normals per field so that results do not
+            #depend on batch_size
+            u = U[:k*r].reshape(k, r)
+            fvs = F[:self.s*k].reshape(self.s, k)
+
+            rng.standard_normal(out = u)
+            if self.sparse:
+                fvs[...] = self.chol@u.T
+            else:
+                np.matmul(self.chol, u.T, out = fvs)
+            fvs += self.mu
+
+            yield fvs
+
+    def calc_cross_cov(self, xa, xb):
+        """
+        Creates the covariance matrix between two sets of points from the
+        variogram model. Coincident points get the full sill.
+        """
+        lags = cdist(xa, xb)
+        zero = lags == 0
+        covariances = self.calc_covariances(lags, out = lags)
+        covariances[zero] = self.sill
+        return covariances
+
+    def calc_covariances(self, lags, out = None):
+        """
+        Covariance values sill - model(lags) for an array of lags. Models
+        from fvariogram built on the built-in models carry a fused covariance
+        variant that is evaluated chunk by chunk without temporaries. Other
+        models are given the lags flattened to 1-D, as in the other
+        generators. If out is given, results are written there, out may be
+        lags itself.
+        """
+        cov = getattr(self.model, "cov", None)
+        if cov is not None:
+            return cov(lags, c = self.sill, out = out)
+
+        covariances = self.sill - np.asarray(self.model(lags.ravel()))
+        covariances = np.broadcast_to(covariances,
+                (lags.size,)).reshape(lags.shape)
+        if out is None:
+            return covariances
+        out[...] = covariances
+        return out
+
+    def condition(self, xd, fd, epsilon = None, robust = None):
+        """
+        Prepares conditional simulation honoring field values observed at
+        data locations. The data block of the covariance matrix and the
+        conditional covariance of the points in self.x are factored once and
+        cached, so every later call to gencf only costs a triangular solve
+        and a matrix-vector product on top of drawing normal values.
+
+        Parameters
+        ----------
+        xd : numpy.ndarray
+            Array of shape (m,n) giving the m data locations in the same
+            n-dimensional domain as self.x
+        fd : numpy.ndarray
+            Field values observed at each of the m data locations
+        epsilon : float
+            Perturbation amount added to the diagonal of both factored
+            blocks, defaults to the epsilon given on initialization
+        robust : bool
+            Retry failed factorizations with growing jitter as in
+            calc_cholesky, falling back to a clipped eigendecomposition of
+            the conditional covariance. Defaults to the robust given on
+            initialization.
+
+        Points of self.x that coincide with a data location have zero
+        conditional variance. They are pinned to the data value and left
+        out of the factored conditional covariance, which would otherwise
+        be singular.
+        """
+        if self.sparse:
+            raise Exception("Conditional simulation requires a dense"
+                    " covariance matrix, use sparse = False")
+
+        xd = np.asarray(xd, dtype = np.float64)
+        fd = np.asarray(fd, dtype = np.float64).ravel()
+        if xd.ndim < 2:
+            xd = xd.reshape(xd.size, 1)
+        x = self.x if self.x.ndim > 1 else self.x.reshape(self.s, 1)
+        if xd.shape[0] != fd.size:
+            raise Exception("Number of data points (xd) and number of field "
+                            "values (fd) do not match.")
+        if xd.shape[1] != x.shape[1]:
+            raise Exception("Data locations (xd) must have the same"
+                    " dimension as x")
+        if epsilon is None:
+            epsilon = self.epsilon
+        if robust is None:
+            robust = self.robust
+        jitters = self.calc_jitters(epsilon, robust)
+
+        self.chol_d = _jittered_cholesky(self.calc_cross_cov(xd, xd), jitters)
+
+        #cross block of the joint factor, L_td = C_td L_dd^-T
+        self.chol_td = solve_triangular(self.chol_d,
+                self.calc_cross_cov(xd, x), lower = True).T
+
+        d, _ = cKDTree(xd).query(x)
+        free = np.flatnonzero(d > 0)
+        xf = x[free]
+        c_c = self.calc_cross_cov(xf, xf) if self.cov is None else \
+                np.asarray(self.cov[np.ix_(free, free)], dtype = np.float64)
+        c_c -= self.chol_td[free]@self.chol_td[free].T
+
+        self.chol_c = np.zeros((self.s, free.size))
+        try:
+            self.chol_c[free] = _jittered_cholesky(c_c, jitters)
+        except np.linalg.LinAlgError:
+            if not robust:
+                raise
+            w, v = eigh(c_c, overwrite_a = True, check_finite = False)
+            self.chol_c[free] = v*np.sqrt(np.clip(w, 0, None))
+
+        self.xd = xd
+        self.fd = fd
+
+    def gencf(self, n=1, fd=None):
+        """
+        Generates random field values honoring the data given to condition,
+        reusing the factorization calculated there.
+
+        Parameters
+        ----------
+        n : int
+            Number of fields to be generated
+        fd : numpy.ndarray
+            Optional new field values at the data locations given to
+            condition. Only requires a triangular solve with the cached
+            factor.
+
+        Returns
+        -------
+        fvs : numpy array
+            Array of field values of shape (dim, n) where each column holds an
+            independently generated conditional field. Each row corresponds to
+            an field point coordinate value.
+        """
+        if not hasattr(self, "chol_c"):
+            raise Exception("Conditioning data not set, call condition"
+                    " before gencf")
+        if fd is None:
+            fd = self.fd
+        fd = np.asarray(fd, dtype = np.float64).ravel()
+        if fd.size != self.fd.size:
+            raise Exception("Number of field values (fd) does not match"
+                    " number of data locations")
+
+        w = solve_triangular(self.chol_d, fd - self.mu, lower = True)
+        U = np.random.normal(0,1, (self.chol_c.shape[1], n))
+        return (self.mu + self.chol_td@w)[:,None] + self.chol_c@U
+
+    def ensemble(self, n, workers = None, seed = None, chunk = 64,
+            backend = "thread"):
+        """
+        Generates a large number of random fields in parallel. Fields are
+        split into chunks of fixed size and each chunk draws from its own
+        stream spawned from a numpy.random.SeedSequence, so the output for a
+        given seed is identical no matter how many workers are used.
+
+        Parameters
+        ----------
+        n : int
+            Number of fields to be generated
+        workers : int
+            Number of threads or processes, defaults to the number of CPUs
+        seed : int, numpy.random.SeedSequence
+            Entropy used to spawn the stream of every chunk
+        chunk : int
+            Number of fields generated by a worker in one task
+        backend : str
+            Either "thread" or "process". Threads share the cholesky factor
+            directly. Processes map a dense factor and the output from shared
+            memory instead of pickling them to every worker, which requires
+            python 3.8 or later.
+
+        Returns
+        -------
+        fvs : numpy array
+            Array of field values of shape (dim, n) where each column holds an
+            independently generated field.
+        """
+        if backend not in ("thread", "process"):
+            raise Exception("'{b}' not recognized backend, either thread or"
+                    " process".format(b = backend))
+        if backend == "process" and self.sparse:
+            raise Exception("Process backend only supports dense cholesky"
+                    " factors, use backend = 'thread' with sparse = True")
+
+        if not isinstance(seed, np.random.SeedSequence):
+            seed = np.random.SeedSequence(seed)
+        starts = list(range(0, n, chunk))
+        seeds = seed.spawn(len(starts))
+        stops = starts[1:] + [n]
+
+        if backend == "thread":
+            fvs = np.empty((self.s, n), dtype = np.float64)
+            fill = functools.partial(_fill_chunk, self.chol, fvs, self.mu)
+            with ThreadPoolExecutor(workers) as ex:
+                list(ex.map(fill, starts, stops, seeds))
+            return fvs
+
+        try:
+            from multiprocessing import shared_memory
+        except ImportError:
+            raise Exception("Process backend requires python 3.8 or later")
+        shms = []
+        try:
+            for shape, dtype in ((self.chol.shape, self.chol.dtype),
+                    ((self.s, n), np.float64)):
+                size = max(int(np.prod(shape))*np.dtype(dtype).itemsize, 1)
+                shms.append(shared_memory.SharedMemory(create = True,
+                    size = size))
+            chol = np.ndarray(self.chol.shape, self.chol.dtype,
+                    buffer = shms[0].buf)
+            chol[...] = self.chol
+            del chol
+
+            spec = ((shms[0].name, self.chol.shape, self.chol.dtype),
+                    (shms[1].name, (self.s, n), np.float64))
+            with ProcessPoolExecutor(workers, initializer = _attach_shared,
+                    initargs = spec) as ex:
+                list(ex.map(_fill_shared, [self.mu]*len(starts), starts,
+                    stops, seeds))
+
+            return np.ndarray((self.s, n), np.float64,
+                    buffer = shms[1].buf).copy()
+        finally:
+            for shm in shms:
+                shm.close()
+                shm.unlink()
+
     def check_init(self):
         if not callable(self.model):
             raise Exception("Model initialization parameter must be function"
@@ -129,3 +782,84 @@ class Revarie:
                     "efined in model input parameter. Should return numpy arr"
                     "ay as well")
 
+
+def _cholmod():
+    """
+    Imports the optional scikit-sparse CHOLMOD backend on first use
+    """
+    try:
+        from sksparse import cholmod
+    except ImportError:
+        raise Exception("scikit-sparse is required for sparse = True")
+    return cholmod
+
+def _fill_chunk(chol, fvs, mu, start, stop, seed):
+    """
+    Fills columns start:stop of fvs with fields drawn from the stream seeded
+    by seed. Used by Revarie.ensemble workers.
+    """
+    rng = np.random.default_rng(seed)
+    u = rng.standard_normal((stop - start, chol.shape[1]))
+    fvs[:, start:stop] = chol@u.T + mu
+
+_shared = {}
+
+def _attach_shared(chol_spec, fvs_spec):
+    """
+    Process pool initializer mapping the cholesky factor and output array of
+    Revarie.ensemble from shared memory
+    """
+    from multiprocessing import shared_memory
+    for key, (name, shape, dtype) in zip(("chol", "fvs"), (chol_spec,
+        fvs_spec)):
+        shm = shared_memory.SharedMemory(name = name)
+        _shared[key + "_shm"] = shm
+        _shared[key] = np.ndarray(shape, dtype, buffer = shm.buf)
+
+def _fill_shared(mu, start, stop, seed):
+    _fill_chunk(_shared["chol"], _shared["fvs"], mu, start, stop, seed)
+
+def _jittered_cholesky(a, jitters):
+    """
+    Cholesky factor of a with the first of jitters on its diagonal that
+    succeeds, a is modified. Raises numpy.linalg.LinAlgError if all fail.
+    """
+    diag = np.diag_indices(a.shape[0])
+    d = a[diag].copy()
+    for jitter in jitters:
+        a[diag] = d + jitter
+        try:
+            return np.linalg.cholesky(a)
+        except np.linalg.LinAlgError:
+            pass
+    raise np.linalg.LinAlgError("Matrix is not positive definite")
+
+def _is_lower(a, step = 1024):
+    """
+    Checks if a square array is lower triangular without copying it whole
+    """
+    for i0 in range(0, a.shape[0], step):
+        i1 = min(i0 + step, a.shape[0])
+        if np.any(a[i0:i1, i1:]) or np.any(np.triu(a[i0:i1, i0:i1], 1)):
+            return False
+    return True
+
+def _zero_upper(a, step = 1024):
+    """
+    Zeroes the strict upper triangle of a square array in place
+    """
+    for i0 in range(0, a.shape[0], step):
+        i1 = min(i0 + step, a.shape[0])
+        a[i0:i1, i1:] = 0
+        a[i0:i1, i0:i1] = np.tril(a[i0:i1, i0:i1])
+
+def _mirror_upper(a, step = 1024):
+    """
+    Restores the strict lower triangle of a symmetric array in place from
+    its upper triangle
+    """
+    for i0 in range(0, a.shape[0], step):
+        i1 = min(i0 + step, a.shape[0])
+        a[i1:, i0:i1] = a[i0:i1, i1:].T
+        blk = a[i0:i1, i0:i1]
+        blk[...] = np.triu(blk) + np.triu(blk, 1).T
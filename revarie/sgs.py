@@ -0,0 +1,180 @@
+import numpy as np
+from scipy.spatial import cKDTree
+
+class SGSRevarie:
+    def __init__(self, x, mu, sill, model, k = 16, epsilon = 0., seed = None,
+            chunk = 4096):
+        """
+        Class to generate random fields with sequential gaussian simulation.
+        Points are visited along a random path and each one is drawn
+        conditionally on its k nearest previously simulated neighbors, so no
+        global covariance matrix is formed and cost is roughly O(n*k^3). The
+        path and the simple kriging weights only depend on the geometry, so
+        they are calculated once and reused for every generated field.
+
+        Parameters
+        ----------
+        x : numpy.ndarray
+            Array of shape (m,n) where n is the number of points in an
+            m-dimensional domain. Each row is a point.
+        mu : float
+            Spatially-independent mean of field values
+        sill : float
+            Spatially-independent variance of field values
+        model : function
+            Callable with takes numpy array of lag distances as argument and
+            returns numpy array of variogram values. Should only take a single
+            parameter.
+        k : int
+            Number of previously simulated neighbors each point is
+            conditioned on
+        epsilon : float
+            Perturbation amount to supress numerical instabilities in the
+            local kriging systems
+        seed : int, numpy.random.Generator
+            Seed or generator used to draw the random path
+        chunk : int
+            Number of local kriging systems solved at once
+        """
+        self.x = x
+        self.mu = mu
+        self.sill = sill
+        self.model = model
+        self.s = x.shape[0]
+        self.k = max(min(int(k), self.s - 1), 0)
+
+        self.check_init()
+
+        x = np.asarray(x, dtype = np.float64)
+        if x.ndim < 2:
+            x = x.reshape(x.size, 1)
+
+        self.path = np.random.default_rng(seed).permutation(self.s)
+        xp = x[self.path]
+
+        self.calc_neighbors(xp)
+        self.calc_weights(xp, epsilon, chunk)
+
+    def calc_neighbors(self, xp):
+        """
+        Finds the k nearest neighbors of every point among the points earlier
+        on the path. Points are stored in path order so earlier points simply
+        have smaller indices. Neighbor queries are widened only for the
+        points that did not find enough earlier neighbors, and points with
+        fewer earlier points than the query width are searched directly.
+        """
+        self.count = np.minimum(np.arange(self.s), self.k)
+        self.nbrs = np.zeros((self.s, self.k), dtype = np.intp)
+        if self.k == 0:
+            return
+
+        tree = cKDTree(xp)
+        todo = np.arange(self.s)
+        kq = min(2*self.k, self.s)
+
+        while todo.size > 0:
+            brute = todo[todo <= kq]
+            if brute.size > 0:
+                d = np.sum((xp[brute,None] - xp[None,:kq])**2, axis = -1)
+                d[np.arange(kq) >= brute[:,None]] = np.inf
+                order = np.argsort(d, axis = 1, kind = "stable")[:,:self.k]
+                self.nbrs[brute] = self.mask(order, brute)
+                todo = todo[todo > kq]
+
+            _, idx = tree.query(xp[todo], k = kq)
+            idx = idx.reshape(todo.size, kq)
+            prev = idx < todo[:,None]
+
+            done = prev.sum(axis = 1) >= self.k
+            order = np.argsort(~prev[done], axis = 1, kind = "stable")
+            nbrs = np.take_along_axis(idx[done], order[:,:self.k], axis = 1)
+
+            self.nbrs[todo[done]] = self.mask(nbrs, todo[done])
+            todo = todo[~done]
+            kq = min(2*kq, self.s)
+
+    def mask(self, nbrs, p):
+        """
+        Points unused neighbor slots of points early on the path at index 0
+        """
+        nbrs[np.arange(self.k) >= self.count[p,None]] = 0
+        return nbrs
+
+    def calc_weights(self, xp, epsilon, chunk):
+        """
+        Solves the simple kriging system of every point on the path in
+        batches. Unused neighbor slots of points early on the path are
+        padded with identity rows so they get zero weight.
+        """
+        self.w = np.zeros((self.s, self.k), dtype = np.float64)
+        self.sd = np.zeros(self.s, dtype = np.float64)
+        eye = np.eye(self.k, dtype = bool)
+
+        for c0 in range(0, self.s, chunk):
+            c1 = min(c0 + chunk, self.s)
+            nb = self.nbrs[c0:c1]
+            xn = xp[nb]
+            valid = np.arange(self.k) < self.count[c0:c1,None]
+            pair = valid[:,:,None] & valid[:,None,:]
+
+            c_nn = self.cov(np.sqrt(np.sum((xn[:,:,None] - xn[:,None,:])**2,
+                axis = -1)))
+            c_nn[~pair] = 0
+            c_nn[:,eye] += np.where(valid, epsilon, 1.)
+
+            c_n0 = self.cov(np.sqrt(np.sum((xn - xp[c0:c1,None])**2,
+                axis = -1)))
+            c_n0[~valid] = 0
+
+            w = np.linalg.solve(c_nn, c_n0[...,None])[...,0]
+            self.w[c0:c1] = w
+            self.sd[c0:c1] = np.sqrt(np.clip(self.sill -
+                np.sum(w*c_n0, axis = 1), 0, None))
+
+    def cov(self, lags):
+        """
+        Covariance values for an array of lags of any shape
+        """
+        covariances = self.sill - np.asarray(self.model(lags.ravel()),
+                dtype = np.float64)
+        covariances = np.broadcast_to(covariances,
+                (lags.size,)).reshape(lags.shape).copy()
+        covariances[lags == 0] = self.sill
+        return covariances
+
+    def genf(self, n=1):
+        """
+        Generates random field values by walking the simulation path with the
+        kriging weights calculated previously.
+
+        Parameters
+        ----------
+        n : int
+            Number of fields to be generated
+
+        Returns
+        -------
+        fvs : numpy array
+            Array of field values of shape (dim, n) where each column holds an
+            independently generated field. Each row corresponds to an field
+            point coordinate value.
+        """
+        y = np.random.normal(0,1, (self.s, n))*self.sd[:,None]
+        for p in range(1, self.s):
+            y[p] += self.w[p]@y[self.nbrs[p]]
+
+        fvs = np.empty_like(y)
+        fvs[self.path] = y + self.mu
+        return fvs
+
+    def check_init(self):
+        if not callable(self.model):
+            raise Exception("Model initialization parameter must be function"
+                    "which takes numpy array of lags as arg and returns corre"
+                    "sponding variogram values")
+        try:
+            self.model(np.zeros(4))
+        except:
+            raise Exception("Lags will be passed as numpy array to callable d"
+                    "efined in model input parameter. Should return numpy arr"
+                    "ay as well")
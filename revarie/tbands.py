@@ -0,0 +1,143 @@
+import numpy as np
+
+from .grid import GridRevarie
+from .models import mtags
+
+def _line_spherical(r, c, rang):
+    r = np.minimum(r/rang, 1)
+    return c*(1 - 3*r + 2*r**3)
+
+def _line_exponential(r, c, rang):
+    return c*(1 - 3*r/rang)*np.exp(-3*r/rang)
+
+def _line_gaussian(r, c, rang):
+    r2 = (2*r/rang)**2
+    return c*(1 - 2*r2)*np.exp(-r2)
+
+#covariances of the line processes that turn into each 3-D model
+ltags = {"sph" : _line_spherical,
+        "exp" : _line_exponential,
+        "gaus" : _line_gaussian}
+
+class TBRevarie:
+    def __init__(self, x, mu, model, options, nlines = 100, res = 20,
+            block = 16):
+        """
+        Class to generate random fields on scattered points with the turning
+        bands method. Every field is a sum of independent 1-D line processes
+        projected onto the points, so no n x n matrix is formed and memory
+        and time are linear in both the number of points and lines. Points in
+        2-D are treated as lying in a plane of a 3-D field.
+
+        Parameters
+        ----------
+        x : numpy.ndarray
+            Array of shape (n,m) where n is the number of points in an
+            m-dimensional domain with m either 2 or 3. Each row is a point.
+        mu : float
+            Spatially-independent mean of field values
+        model : str
+            Tag of one of the built-in models, see models.mtags
+        options : list
+            Parameters of the built-in model in the same order as for
+            fvariogram, [nug, sill, rang]. The nugget is added as white
+            noise.
+        nlines : int
+            Number of lines used for every field. More lines give a better
+            approximation of the model at proportionally higher cost.
+        res : int
+            Number of line discretization nodes per model range
+        block : int
+            Number of lines projected onto the points at once
+        """
+        self.x = np.asarray(x, dtype = np.float64)
+        self.mu = mu
+        self.model = model
+        self.options = options
+        self.nlines = int(nlines)
+        self.block = int(block)
+
+        self.check_init()
+
+        self.nug, self.sill, self.rang = options
+        self.s = self.x.shape[0]
+
+        self.calc_lines(res)
+
+    def calc_lines(self, res):
+        """
+        Centers points in 3-D, sets up quasi-uniform line directions and the
+        generator of the 1-D line processes
+        """
+        x = self.x - (self.x.max(axis = 0) + self.x.min(axis = 0))/2
+        self.x3 = np.zeros((self.s, 3))
+        self.x3[:,:x.shape[1]] = x
+
+        #fibonacci lattice on the upper half of the unit sphere
+        i = np.arange(self.nlines) + .5
+        z = 1 - i/self.nlines
+        phi = np.pi*(3 - np.sqrt(5))*i
+        rho = np.sqrt(1 - z**2)
+        self.dirs = np.stack((rho*np.cos(phi), rho*np.sin(phi), z), axis = 1)
+
+        self.dt = self.rang/res
+        half = np.sqrt(np.sum(x**2, axis = 1)).max()
+        self.nt = int(np.ceil(2*half/self.dt)) + 2
+        self.t0 = -half
+
+        c = self.sill - self.nug
+        line = ltags[self.model]
+        self.lines = GridRevarie(self.nt, self.dt, 0, c,
+                lambda h : c - line(h, c, self.rang))
+
+    def genf(self, n=1):
+        """
+        Generates random field values by summing line processes along
+        randomly rotated directions.
+
+        Parameters
+        ----------
+        n : int
+            Number of fields to be generated
+
+        Returns
+        -------
+        fvs : numpy array
+            Array of field values of shape (dim, n) where each column holds an
+            independently generated field. Each row corresponds to an field
+            point coordinate value.
+        """
+        fvs = np.zeros((self.s, n))
+
+        for i in range(n):
+            q, r = np.linalg.qr(np.random.normal(0,1, (3,3)))
+            dirs = self.dirs@(q*np.sign(np.diag(r)))
+            y = self.lines.genf(self.nlines)
+
+            for l in range(0, self.nlines, self.block):
+                t = self.x3@dirs[l:l + self.block].T
+                idx = np.rint((t - self.t0)/self.dt).astype(np.intp)
+                fvs[:,i] += np.sum(np.take_along_axis(y[:,l:l + self.block],
+                    idx, axis = 0), axis = 1)
+
+        fvs /= np.sqrt(self.nlines)
+        if self.nug > 0:
+            fvs += np.random.normal(0, np.sqrt(self.nug), (self.s, n))
+
+        return fvs + self.mu
+
+    def check_init(self):
+        if self.model not in ltags.keys():
+            n = ",".join(["'{g}'".format(g=h) for h in ltags.keys()])
+            raise Exception("Turning bands is only available for the built-in"
+                    " models: " + n)
+        try:
+            mtags[self.model](*([0] + list(self.options)))
+        except:
+            raise Exception("options parameter not of proper length "
+                "to fill *args of selected built-in model")
+        if self.x.ndim != 2 or self.x.shape[1] not in (2, 3):
+            raise Exception("Turning bands requires points given as rows of"
+                    " a 2-D or 3-D domain")
+        if self.nlines < 1:
+            raise Exception("At least one line is required")
@@ -0,0 +1,45 @@
+import unittest
+from revarie import GridRevarie, Revarie, fvariogram
+import numpy as np
+
+class TestGridRevarie(unittest.TestCase):
+    def test_shape(self):
+        """
+        Make sure generated fields are shaped like Revarie.genf output
+        """
+        m = fvariogram("func", "exp", [0, 1, 3])
+        g = GridRevarie((6,5,4), 1., 0, 1, m)
+
+        self.assertEqual(g.genf(3).shape, (120, 3))
+        self.assertEqual(g.x.shape, (120, 3))
+
+    def test_trivial(self):
+        """
+        Make sure field generation in trivial case is correct
+        """
+        m = lambda h : 0
+        g = GridRevarie((4,4), .5, 2, 0, m)
+
+        self.assertTrue(np.allclose(g.genf(2), 2))
+
+    def test_cov(self):
+        """
+        Compare sample covariance of grid fields to the exact covariance
+        """
+        np.random.seed(3)
+        m = fvariogram("func", "sph", [0, 1, 4])
+        g = GridRevarie((6,5), (1., 1.5), 0, 1, m)
+
+        fvs = g.genf(8000)
+        exact = Revarie(g.x, 0, 1, m, 1e-10).cov
+
+        self.assertTrue(np.abs(np.cov(fvs) - exact).max() < .1)
+
+    def test_padding(self):
+        """
+        Embedding of smooth models must be padded beyond the minimal size
+        """
+        m = fvariogram("func", "gaus", [0, 1, 8])
+        g = GridRevarie(16, 1., 0, 1, m)
+
+        self.assertTrue(g.m[0] > 30)
@@ -0,0 +1,90 @@
+import unittest
+from revarie import GridVariogram, Variogram, GridRevarie, fvariogram
+import numpy as np
+
+class TestGridVariogram(unittest.TestCase):
+    def test_pairs(self):
+        """
+        Binned output must match Variogram on the observed cells
+        """
+        np.random.seed(5)
+        f = np.random.normal(3, 2, (17,12))
+        f[np.random.uniform(0,1,f.shape) < .2] = np.nan
+        g = GridVariogram(f, (1., .5))
+
+        x = np.stack(np.meshgrid(np.arange(17)*1., np.arange(12)*.5,
+            indexing = "ij"), axis = -1)
+        obs = ~np.isnan(f)
+        v = Variogram(x[obs], f[obs])
+
+        self.assertTrue(np.allclose(g.range, v.range))
+        for bt, b in [("auto", 9), ("bound", [0, .6, 1.2, 3, 5, 30])]:
+            for a, b in zip(g.matheron(bt, b, True), v.matheron(bt, b, True)):
+                self.assertTrue(np.allclose(a, b, equal_nan = True))
+
+    def test_vmap(self):
+        """
+        Variogram map must be symmetric and close to the model on a large
+        simulated field
+        """
+        m = fvariogram("func", "exp", [0, 1, 10])
+        f = GridRevarie((128,128), 1., 0, 1, m).genf(1).reshape(128,128)
+        lags, n, v = GridVariogram(f).vmap()
+
+        self.assertEqual(v.shape, (255,255))
+        self.assertTrue(np.array_equal(n, n[::-1,::-1]))
+        self.assertTrue(np.allclose(v, v[::-1,::-1], equal_nan = True))
+        self.assertEqual(n[127,128], 128*127)
+        self.assertTrue(abs(v[127,127 + 10] - m(10.)) < .25)
+
+    def test_directional(self):
+        """
+        Directional output must match Variogram on the observed cells
+        """
+        np.random.seed(7)
+        f = np.random.normal(0, 1, (9,8,7))
+        f[np.random.uniform(0,1,f.shape) < .1] = np.nan
+        g = GridVariogram(f, (1., .7, 1.3))
+
+        x = np.stack(np.meshgrid(np.arange(9)*1., np.arange(8)*.7,
+            np.arange(7)*1.3, indexing = "ij"), axis = -1)
+        obs = ~np.isnan(f)
+        v = Variogram(x[obs], f[obs])
+
+        dirs = [[0, 0], [45, 0], [60, 30]]
+        for a, b in zip(g.directional(dirs, 15, "auto", 7, True),
+                v.directional(dirs, 15, "auto", 7, True)):
+            self.assertTrue(np.allclose(a, b, equal_nan = True))
+
+    def test_estimate(self):
+        """
+        Matheron estimate of a grid must match self.matheron, other
+        estimators are not available
+        """
+        f = np.random.normal(0, 1, (10,9))
+        g = GridVariogram(f)
+        c, n, v = g.estimate("auto", 6, "matheron")
+
+        self.assertEqual(v["matheron"].shape, (6,))
+        self.assertTrue(np.allclose(v["matheron"], g.matheron("auto", 6)[2]))
+        self.assertRaises(Exception, g.estimate, "auto", 6, "cressie")
+
+    def test_unsupported(self):
+        """
+        Pair-based operations must fail cleanly, maps can be cropped
+        """
+        g = GridVariogram(np.random.normal(0, 1, (8,6)))
+        for call in [lambda : g.reduce("abs", [0, 2]),
+                lambda : g.rreduce("frac", .5), g.build_index, g.cloud,
+                lambda : g.append(np.zeros((1,2)), np.zeros(1)),
+                lambda : g.bootstrap(10), lambda : g.vmap(nbins = 5)]:
+            self.assertRaises(Exception, call)
+
+        lags, n, v = g.vmap(lag = 2)
+        self.assertEqual(v.shape, (5,5))
+        self.assertTrue(np.allclose(v, g.vmap()[2][5:10,3:8],
+            equal_nan = True))
+
+        g.track("auto", 5)
+        for a, b in zip(g.tracked(), g.matheron("auto", 5)):
+            self.assertTrue(np.allclose(a, b))
@@ -0,0 +1,55 @@
+import unittest
+import subprocess
+import sys
+
+class TestImport(unittest.TestCase):
+    def test_lazy(self):
+        """
+        Importing the package must not load heavy dependencies until a
+        class that needs them is used
+        """
+        code = ("import sys, revarie\n"
+                "heavy = ('scipy', 'sksparse')\n"
+                "print(sorted({m.split('.')[0] for m in sys.modules} &"
+                " set(heavy)))\n"
+                "revarie.Revarie, revarie.Variogram, revarie.fvariogram\n"
+                "print('scipy' in sys.modules)\n")
+        out = subprocess.check_output([sys.executable, "-c", code]).split()
+
+        self.assertEqual(out, [b"[]", b"True"])
+
+    def test_names(self):
+        """
+        Public names should be unchanged
+        """
+        import revarie
+        from revarie.fvariogram import fvariogram
+
+        self.assertTrue(revarie.fvariogram is fvariogram)
+        for name in ["Revarie", "Variogram", "GridVariogram", "GridRevarie",
+                "SGSRevarie",
+                "TBRevarie", "FactorCache", "mtags", "spherical", "interp",
+                "polyfit", "bmodel_fit", "umodel_fit", "curve_fit",
+                "interp1d"]:
+            self.assertTrue(hasattr(revarie, name))
+
+        ns = {}
+        exec("from revarie import *", ns)
+        for name in ["Revarie", "Variogram", "GridVariogram", "GridRevarie",
+                "SGSRevarie", "TBRevarie", "FactorCache", "fvariogram",
+                "mtags", "spherical", "interp", "polyfit", "bmodel_fit",
+                "umodel_fit", "curve_fit", "interp1d", "np", "revarie",
+                "variogram"]:
+            self.assertTrue(name in ns)
+        self.assertTrue(ns["fvariogram"] is fvariogram)
+
+        from revarie.revarie import Variogram
+        from revarie.variogram import Variogram as V
+        self.assertTrue(Variogram is V)
+
+        ns = {}
+        exec("from revarie.revarie import *", ns)
+        for name in ["Revarie", "Variogram", "fvariogram", "mtags",
+                "spherical", "pdist", "curve_fit", "interp1d", "np"]:
+            self.assertTrue(name in ns)
+        self.assertTrue(ns["fvariogram"] is fvariogram)
@@ -0,0 +1,50 @@
+import unittest
+from revarie.models import *
+from revarie import fvariogram
+import numpy as np
+
+class TestModels(unittest.TestCase):
+    def test_values(self):
+        """
+        Test built-in models against their closed forms
+        """
+        h = np.linspace(0,10,1001)
+        nug, sill, rang = .2, 4, 6
+        r = np.minimum(h/rang, 1)
+
+        exact = {"sph" : nug + (sill - nug)*(1.5*r - .5*r**3),
+                 "exp" : nug + (sill - nug)*(1 - np.exp(-3*h/rang)),
+                 "gaus" : nug + (sill - nug)*(1 - np.exp(-(2*h/rang)**2))}
+
+        for tag, v in exact.items():
+            self.assertTrue(np.allclose(mtags[tag](h, nug, sill, rang), v))
+            self.assertTrue(np.allclose(mtags[tag](h, nug, sill, rang,
+                chunk = 7), v))
+            self.assertTrue(np.allclose(ctags[tag](h, nug, sill, rang), sill
+                - v))
+            self.assertTrue(np.allclose(ctags[tag](h, nug, sill, rang, 5), 5
+                - v))
+
+    def test_out(self):
+        """
+        Test that results are written into out, including in place on lags
+        """
+        h = np.random.uniform(0,3,(20,30))
+        v = spherical(h, .1, 1, 2)
+
+        out = np.empty_like(h)
+        self.assertTrue(spherical(h, .1, 1, 2, out = out) is out)
+        self.assertTrue(np.allclose(out, v))
+
+        spherical_cov(h, .1, 1, 2, out = h)
+        self.assertTrue(np.allclose(h, 1 - v))
+
+    def test_fvariogram_cov(self):
+        """
+        Test covariance variant attached to built-in fvariogram models
+        """
+        h = np.linspace(0,10,100)
+        m = fvariogram("func", "exp", [.2, 4, 6])
+
+        self.assertTrue(np.allclose(m.cov(h, c = 5), 5 - m(h)))
+        self.assertTrue(np.allclose(m(h, chunk = 8), m(h)))
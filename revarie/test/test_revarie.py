@@ -1,6 +1,10 @@
 import unittest
-from revarie import Revarie
+import sys
+from revarie import Revarie, FactorCache
 import numpy as np
+import tempfile
+import os
+from pathlib import Path
 
 class TestRevarie(unittest.TestCase):
     def test_init(self):
@@ -64,3 +68,253 @@ class TestRevarie(unittest.TestCase):
 
         self.assertTrue(np.allclose(r_dens.cov, r_spar.cov.toarray()))
 
+    def test_sparse_assembly(self):
+        """
+        Neighbor-search sparse assembly should match the dense covariance
+        """
+        x = np.random.uniform(0,3,(40,2))
+        m = lambda h : np.piecewise(h, [h<=1,h>1],[lambda h : h,1])
+
+        r = Revarie(x, 0, 1, m, 1e-10)
+        for cutoff in [None, 1.]:
+            r.cutoff = cutoff
+            self.assertTrue(np.allclose(r.cov,
+                r.calc_sparse_cov(x).toarray()))
+
+    def test_find_cutoff(self):
+        """
+        Probed cutoff should bound the model range from above
+        """
+        x = np.linspace(0,10,10)
+        m = lambda h : np.piecewise(h, [h<=2,h>2],[lambda h : h/2,1])
+
+        r = Revarie(x, 0, 1, m)
+        c = r.find_cutoff(x.reshape(-1,1))
+        self.assertTrue(2 <= c < 2.1)
+
+    def test_iter_fields(self):
+        """
+        Streamed batches should not depend on batch size and reuse buffers
+        """
+        x = np.random.uniform(0,1,(20,2))
+        m = lambda h : 1 - np.exp(-h)
+
+        r = Revarie(x, 2, 1, m, 1e-10)
+
+        a = np.hstack([f.copy() for f in r.iter_fields(10, 3, rng = 7)])
+        b = np.hstack([f.copy() for f in r.iter_fields(10, 4, rng = 7)])
+        self.assertEqual(a.shape, (20, 10))
+        self.assertTrue(np.allclose(a, b))
+
+        it = r.iter_fields(4, 2)
+        self.assertTrue(np.shares_memory(next(it), next(it)))
+
+    def test_model_1d(self):
+        """
+        Callable models should only ever be given 1-D arrays of lags
+        """
+        x = np.random.uniform(0,1,(30,2))
+        m = lambda h : 1 - np.exp(-h)
+        m_1d = lambda h : np.array([1 - np.exp(-v) for v in h])
+
+        a = Revarie(x, 0, 1, m, 1e-10)
+        b = Revarie(x, 0, 1, m_1d, 1e-10)
+        self.assertTrue(np.allclose(a.cov, b.cov))
+        self.assertTrue(np.allclose(a.calc_cross_cov(x[:5], x),
+            b.calc_cross_cov(x[:5], x)))
+
+    def test_ensemble(self):
+        """
+        Parallel ensembles should be identical for any number of workers
+        """
+        x = np.random.uniform(0,1,(30,2))
+        m = lambda h : 1 - np.exp(-h)
+
+        r = Revarie(x, 1, 1, m, 1e-10)
+
+        a = r.ensemble(50, workers = 1, seed = 3, chunk = 8)
+        b = r.ensemble(50, workers = 4, seed = 3, chunk = 8)
+        self.assertEqual(a.shape, (30, 50))
+        self.assertTrue(np.array_equal(a, b))
+
+    @unittest.skipIf(sys.version_info < (3, 8),
+            "process backend requires python 3.8 or later")
+    def test_ensemble_process(self):
+        """
+        Process ensembles should match thread ensembles
+        """
+        x = np.random.uniform(0,1,(30,2))
+        m = lambda h : 1 - np.exp(-h)
+
+        r = Revarie(x, 1, 1, m, 1e-10)
+
+        a = r.ensemble(50, workers = 1, seed = 3, chunk = 8)
+        c = r.ensemble(50, workers = 2, seed = 3, chunk = 8,
+                backend = "process")
+        self.assertTrue(np.array_equal(a, c))
+
+    def test_condition(self):
+        """
+        Conditional fields should honor data and follow the kriging mean
+        """
+        np.random.seed(1)
+        xd = np.random.uniform(0,1,(5,2))
+        fd = np.random.uniform(-1,1,5)
+        x = np.vstack((xd, np.random.uniform(0,1,(15,2))))
+        m = lambda h : 1 - np.exp(-h/.3)
+
+        r = Revarie(x, 0, 1, m, 1e-10)
+        r.condition(xd, fd)
+
+        fvs = r.gencf(4000)
+        self.assertEqual(fvs.shape, (20, 4000))
+        self.assertTrue(np.allclose(fvs[:5], fd[:,None], atol = 1e-3))
+
+        c_td = r.cov[:,:5]
+        krig = c_td@np.linalg.solve(r.cov[:5,:5], fd)
+        self.assertTrue(np.abs(fvs.mean(axis=1) - krig).max() < .1)
+
+        fvs = r.gencf(2, fd = np.zeros(5))
+        self.assertTrue(np.allclose(fvs[:5], 0, atol = 1e-3))
+
+    def test_condition_pinned(self):
+        """
+        Data on simulation points must be honored exactly without epsilon,
+        also without a stored covariance matrix
+        """
+        np.random.seed(2)
+        x = np.random.uniform(0,1,(30,2))
+        fd = np.random.uniform(-1,1,5)
+        m = lambda h : 1 - np.exp(-h/.3)
+
+        for kw in [{}, {"lean" : True}, {"robust" : True}]:
+            r = Revarie(x, 0, 1, m, 1e-12, **kw)
+            r.condition(x[:5], fd, epsilon = 0)
+            fvs = r.gencf(500)
+
+            self.assertTrue(np.allclose(fvs[:5], fd[:,None]))
+            self.assertTrue(np.all(np.std(fvs[5:], axis = 1) > 0))
+
+        r.condition(x, np.zeros(30), epsilon = 0)
+        self.assertTrue(np.allclose(r.gencf(2), 0))
+
+    def test_lowrank(self):
+        """
+        Pivoted cholesky should reach the requested trace error
+        """
+        x = np.random.uniform(0,1,(200,2))
+        m = lambda h : 1 - np.exp(-(h/.8)**2)
+
+        r = Revarie(x, 0, 1, m, 1e-10)
+        a = Revarie(x, 0, 1, m, tol = 1e-6)
+
+        self.assertTrue(a.cov is None)
+        self.assertTrue(a.rank < 100)
+        self.assertTrue(a.err <= 1e-6)
+        #trace of the remaining covariance bounds every entry of the error
+        self.assertTrue(np.abs(a.chol@a.chol.T - r.cov).max() <
+                1e-6*np.trace(r.cov))
+        self.assertEqual(a.genf(3).shape, (200, 3))
+
+        a = Revarie(x, 0, 1, m, tol = 0, max_rank = 5)
+        self.assertEqual(a.chol.shape, (200, 5))
+
+    def test_cache(self):
+        """
+        Cached factors should be reused and evicted least recently used first
+        """
+        x = np.random.uniform(0,1,(30,2))
+        m = lambda h : 1 - np.exp(-h)
+
+        with tempfile.TemporaryDirectory() as d:
+            cache = FactorCache(d)
+            a = Revarie(x, 0, 1, m, 1e-10, cache = cache)
+            b = Revarie(x, 0, 1, m, 1e-10, cache = cache)
+
+            self.assertTrue(b.cov is None)
+            self.assertTrue(isinstance(b.chol, np.memmap))
+            self.assertTrue(np.array_equal(a.chol, b.chol))
+
+            c = Revarie(x, 0, 2, m, 1e-10, cache = cache)
+            self.assertTrue(c.cov is not None)
+
+            cache.max_bytes = 1.5*cache.size(Path(d) / os.listdir(d)[0])
+            Revarie(x[:29], 0, 2, m, 1e-10, cache = cache)
+            self.assertEqual(len(os.listdir(d)), 1)
+
+        xx = np.vstack((x, x[:5]))
+        with tempfile.TemporaryDirectory() as d:
+            cache = FactorCache(d)
+            a = Revarie(xx, 0, 1, m, robust = True, cache = cache)
+            b = Revarie(xx, 0, 1, m, robust = True, cache = cache)
+
+            self.assertTrue(b.cov is None)
+            self.assertTrue(b.jitter > 0)
+            self.assertEqual(b.jitter, a.jitter)
+            self.assertEqual(b.attempts, a.attempts)
+
+    def test_lean(self):
+        """
+        In-place and single precision factorizations should match the
+        default dense factorization
+        """
+        x = np.random.uniform(0,1,(50,2))
+        m = lambda h : 1 - np.exp(-h/.3)
+
+        r = Revarie(x, 0, 1, m, 1e-8)
+        a = Revarie(x, 0, 1, m, 1e-8, lean = True)
+        b = Revarie(x, 0, 1, m, 1e-4, lean = True, dtype = np.float32)
+
+        self.assertTrue(a.cov is None)
+        self.assertTrue(np.allclose(np.tril(r.chol), r.chol))
+        self.assertTrue(np.allclose(r.chol, a.chol))
+        self.assertEqual(b.chol.dtype, np.float32)
+        self.assertTrue(np.allclose(r.chol, b.chol, atol = 1e-3))
+        self.assertEqual(b.genf(2).shape, (50, 2))
+
+    def test_robust(self):
+        """
+        Failed factorizations should be retried with growing jitter and
+        fall back to a clipped eigendecomposition
+        """
+        x = np.random.uniform(0,1,(20,2))
+        x = np.vstack((x, x[:5]))
+        m = lambda h : 1 - np.exp(-h/.3)
+
+        with self.assertRaises(np.linalg.LinAlgError):
+            Revarie(x, 0, 1, m)
+
+        cov = Revarie(x, 0, 1, m, 1e-3).cov
+        for lean in [False, True]:
+            r = Revarie(x, 0, 1, m, robust = True, lean = lean)
+            self.assertTrue(r.jitter > 0)
+            self.assertTrue(len(r.attempts) > 1)
+            self.assertEqual(r.attempts[-1][0], "cholesky")
+            self.assertTrue(np.allclose(r.chol@r.chol.T,
+                cov + r.jitter*np.eye(25)))
+
+        m = lambda h : np.where(h > 0, 2., 0.)
+        r = Revarie(x, 0, 1, m, robust = True)
+        self.assertEqual(r.attempts[-1][0], "eigh")
+        self.assertEqual(r.genf(2).shape, (25, 2))
+
+    def test_add_points(self):
+        """
+        Extending a factorization should match factoring all points at once
+        """
+        x = np.random.uniform(0,1,(40,2))
+        m = lambda h : 1 - np.exp(-h/.3)
+
+        r = Revarie(x[:30], 0, 1, m, 1e-10)
+        r.add_points(x[30:35])
+        r.add_points(x[35:])
+        full = Revarie(x, 0, 1, m, 1e-10)
+
+        self.assertEqual(r.s, 40)
+        self.assertTrue(np.allclose(r.x, x))
+        self.assertTrue(np.allclose(r.cov, full.cov))
+        self.assertTrue(np.allclose(r.chol, full.chol))
+
+        r = Revarie(x[:30], 0, 1, m, tol = 1e-3)
+        with self.assertRaises(Exception):
+            r.add_points(x[30:])
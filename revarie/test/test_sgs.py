@@ -0,0 +1,52 @@
+import unittest
+from revarie import SGSRevarie, Revarie
+import numpy as np
+
+class TestSGSRevarie(unittest.TestCase):
+    def test_shape(self):
+        """
+        Make sure generated fields are shaped like Revarie.genf output
+        """
+        x = np.random.uniform(0,1,(200,2))
+        m = lambda h : 1 - np.exp(-h/.2)
+
+        r = SGSRevarie(x, 0, 1, m, k = 8)
+        self.assertEqual(r.genf(3).shape, (200, 3))
+
+    def test_trivial(self):
+        """
+        Make sure field generation in trivial case is correct
+        """
+        x = np.random.uniform(-1,1, (20,2))
+        m = lambda h : 0
+
+        r = SGSRevarie(x, 1, 0, m, k = 4, epsilon = 1e-13)
+        self.assertTrue(np.allclose(r.genf(), 1))
+
+    def test_neighbors(self):
+        """
+        Neighbors must be the nearest points earlier on the path
+        """
+        x = np.random.uniform(0,1,(150,3))
+        m = lambda h : 1 - np.exp(-h)
+
+        r = SGSRevarie(x, 0, 1, m, k = 5, seed = 2)
+        xp = x[r.path]
+        for p in [1, 3, 40, 149]:
+            d = np.sqrt(np.sum((xp[:p] - xp[p])**2, axis = 1))
+            exp = np.sort(d)[:min(p, 5)]
+            got = np.sort(d[r.nbrs[p,:r.count[p]]])
+            self.assertTrue(np.allclose(exp, got))
+
+    def test_cov(self):
+        """
+        Conditioning on every earlier point reproduces the exact covariance
+        """
+        np.random.seed(4)
+        x = np.random.uniform(0,1,(12,2))
+        m = lambda h : 1 - np.exp(-h/.4)
+
+        r = SGSRevarie(x, 0, 1, m, k = 11, epsilon = 1e-10)
+        exact = Revarie(x, 0, 1, m, 1e-10).cov
+
+        self.assertTrue(np.abs(np.cov(r.genf(8000)) - exact).max() < .1)
@@ -0,0 +1,37 @@
+import unittest
+from revarie import TBRevarie, Revarie, fvariogram
+import numpy as np
+
+class TestTBRevarie(unittest.TestCase):
+    def test_shape(self):
+        """
+        Make sure generated fields are shaped like Revarie.genf output
+        """
+        x = np.random.uniform(0,1,(100,3))
+
+        r = TBRevarie(x, 0, "sph", [0, 1, .3], nlines = 10)
+        self.assertEqual(r.genf(3).shape, (100, 3))
+
+    def test_cov(self):
+        """
+        Compare sample covariance of turning bands fields to the exact
+        covariance of each built-in model in 2-D and 3-D
+        """
+        np.random.seed(5)
+        for dim, tag in [(2, "sph"), (3, "exp"), (2, "gaus")]:
+            x = np.random.uniform(0,1,(8,dim))
+            opts = [.1, 1.5, .8]
+
+            r = TBRevarie(x, 1, tag, opts, nlines = 60)
+            exact = Revarie(x, 1, 1.5, fvariogram("func", tag, opts)).cov
+
+            self.assertTrue(np.abs(np.cov(r.genf(3000)) - exact).max() < .15)
+
+    def test_bad_model(self):
+        """
+        Only built-in models have known line processes
+        """
+        x = np.random.uniform(0,1,(10,2))
+
+        with self.assertRaises(Exception):
+            TBRevarie(x, 0, "poly", [0, 1, .3])
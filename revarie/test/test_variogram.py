@@ -2,6 +2,7 @@ import unittest
 from revarie import Variogram
 import numpy as np
 import itertools
+import copy
 from scipy.spatial.distance import pdist
 
 
@@ -69,9 +70,339 @@ class TestVariogram(unittest.TestCase):
 
         self.assertTrue(np.array_equal(np.diff(l2)>0, np.diff(d2)>0))
 
+    def test_stream(self):
+        """
+        Streaming Matheron estimates must match those from stored lags
+        """
+        x = np.random.uniform(0,10,(300,2))
+        f = np.random.normal(0,1,300)
+
+        v = Variogram(x, f)
+        vs = Variogram(x, f, stream = True, block = 1000)
+
+        self.assertTrue(np.allclose(v.range, vs.range))
+        for bt, b in [("auto", 12), ("lin", [1, 6, 8]),
+                ("bound", [-1, .5, 2, 4, 20])]:
+            a = v.matheron(bt, b, var = True)
+            s = vs.matheron(bt, b, var = True)
+            for ra, rs in zip(a, s):
+                self.assertTrue(np.allclose(ra, rs, equal_nan = True))
+
+        self.assertRaises(Exception, vs.cloud)
+
+    def test_pairs(self):
+        """
+        Pair blocks must cover all pairs in the order of pdist
+        """
+        v = Variogram(np.random.uniform(0,1,(37,2)), np.zeros(37),
+                stream = True, block = 50)
+        ii, jj = map(np.concatenate, zip(*v.iter_pairs()))
+        c = np.mask_indices(37, np.triu, k=1)
+
+        self.assertTrue(np.array_equal(ii, c[0]))
+        self.assertTrue(np.array_equal(jj, c[1]))
+
+    def test_max_lag(self):
+        """
+        Distance-bounded pairs must be the pdist pairs within max_lag, in
+        order, both stored and streamed
+        """
+        x = np.random.uniform(0,10,(400,3))
+        f = np.random.normal(0,1,400)
+
+        v = Variogram(x, f)
+        near = v.lags <= 2.5
+        vm = Variogram(x, f, max_lag = 2.5)
+
+        self.assertTrue(np.allclose(vm.lags, v.lags[near]))
+        self.assertTrue(np.allclose(vm.diffs, v.diffs[near]))
+
+        vs = Variogram(x, f, max_lag = 2.5, stream = True, block = 500)
+        a = vm.matheron("auto", 10, var = True)
+        s = vs.matheron("auto", 10, var = True)
+        for ra, rs in zip(a, s):
+            self.assertTrue(np.allclose(ra, rs, equal_nan = True))
+        self.assertTrue(np.isclose(vm.bbs[-1], 2.5))
+
+    def test_multi_field(self):
+        """
+        Variograms of several fields at once must match those computed one
+        field at a time
+        """
+        x = np.random.uniform(0,10,(200,2))
+        f = np.random.normal(0,1,(200,4))
 
+        for kw in [{}, {"stream" : True, "block" : 700}, {"max_lag" : 4.}]:
+            c, n, v, vv = Variogram(x, f, **kw).matheron("auto", 8, True)
+            self.assertEqual(v.shape, (8,4))
+            self.assertEqual(vv.shape, (8,4))
 
+            for i in range(4):
+                ci, ni, vi, vvi = Variogram(x, f[:,i], **kw).matheron("auto",
+                        8, True)
+                self.assertTrue(np.allclose(c, ci))
+                self.assertTrue(np.array_equal(n, ni))
+                self.assertTrue(np.allclose(v[:,i], vi))
+                self.assertTrue(np.allclose(vv[:,i], vvi))
 
+    def test_directional(self):
+        """
+        Directions must match Variogram on the pairs within tolerance, and
+        an all-inclusive tolerance must match the omnidirectional estimate
+        """
+        x = np.random.uniform(0,10,(250,3))
+        f = np.random.normal(0,1,250)
+        v = Variogram(x, f)
+        dirs = [[30, 0], [120, 45], [0, 90]]
+
+        c, n, d, dv = v.directional(dirs, 20, "auto", 6, True)
+        self.assertEqual(d.shape, (6,3))
+
+        ii, jj = np.mask_indices(250, np.triu, k=1)
+        dx = x[ii] - x[jj]
+        for i, (az, dip) in enumerate(np.radians(dirs)):
+            u = np.array([np.cos(dip)*np.cos(az), np.cos(dip)*np.sin(az),
+                np.sin(dip)])
+            keep = np.abs(dx@u) >= np.cos(np.radians(20))*v.lags
+            sub = Variogram(x, f)
+            sub.lags, sub.diffs = v.lags[keep], v.diffs[keep]
+            ci, ni, di, dvi = sub.matheron("bound", v.bbs, True)
+            self.assertTrue(np.array_equal(n[:,i], ni))
+            self.assertTrue(np.allclose(d[:,i], di, equal_nan = True))
+            self.assertTrue(np.allclose(dv[:,i], dvi, equal_nan = True))
+
+        a = v.matheron("auto", 6)
+        b = Variogram(x, f, stream = True, block = 900).directional(
+                [10, 70], 90, "auto", 6)
+        for i in range(2):
+            self.assertTrue(np.array_equal(a[1], b[1][:,i]))
+            self.assertTrue(np.allclose(a[2], b[2][:,i]))
+
+    def test_vmap(self):
+        """
+        Variogram map must be symmetric and hold every pair twice
+        """
+        x = np.random.uniform(0,10,(150,2))
+        f = np.random.normal(0,1,150)
+        e, n, m = Variogram(x, f).vmap(lag = 20, nbins = 8)
+
+        self.assertEqual(n.sum(), 150*149)
+        self.assertTrue(np.array_equal(n, n[::-1,::-1]))
+        self.assertTrue(np.allclose(m, m[::-1,::-1], equal_nan = True))
+
+    def test_estimators(self):
+        """
+        Robust estimators must match their definitions bin by bin
+        """
+        x = np.random.uniform(0,10,(200,2))
+        f = np.random.normal(0,1,(200,2))
+        f[::25] += 50 #outliers
+        v = Variogram(x, f)
+        c, n, e = v.estimate("auto", 7)
+
+        self.assertTrue(np.allclose(e["matheron"], v.matheron("auto", 7)[2]))
+        b = np.digitize(v.lags, v.bbs)
+        for i in range(7):
+            d = np.abs(np.sqrt(v.diffs[b == i + 1]))
+            m = d.shape[0]
+            ch = np.mean(np.sqrt(d), axis = 0)**4/(.457 + .494/m +
+                    .045/m**2)/2
+            self.assertTrue(np.allclose(e["cressie"][i], ch))
+            self.assertTrue(np.allclose(e["dowd"][i],
+                2.198*np.median(d, axis = 0)**2/2))
+
+        s = Variogram(x, f, stream = True, block = 500).estimate("auto", 7,
+                ["cressie"])
+        self.assertTrue(np.allclose(s[2]["cressie"], e["cressie"]))
+        self.assertRaises(Exception, Variogram(x, f, stream = True).estimate,
+                "auto", 7, "dowd")
+
+    def test_sample(self):
+        """
+        Sampled pairs must be valid, distinct point pairs with their lags
+        and squared differences, and stratification must balance lags
+        """
+        x = np.random.uniform(0,10,(500,2))
+        f = np.random.normal(0,1,500)
+        v = Variogram(x, f, sample = 3000, seed = 2)
+        ii, jj = v.pairs
+
+        self.assertTrue(v.reduced)
+        self.assertEqual(v.lags.size, 3000)
+        self.assertTrue(np.all(ii < jj))
+        self.assertTrue(np.allclose(v.lags, np.sqrt(np.sum((x[ii] -
+            x[jj])**2, axis = 1))))
+        self.assertTrue(np.allclose(v.diffs, (f[ii] - f[jj])**2))
+        self.assertTrue(np.array_equal(v.lags, Variogram(x, f, sample = 3000,
+            seed = 2).lags))
+
+        s = Variogram(x, f, sample = 3000, strata = [0, 1, 2, 15], seed = 2)
+        self.assertEqual(s.lags.size, 3000)
+        self.assertTrue(np.sum(s.lags < 2) > 3*np.sum(v.lags < 2))
+
+    def test_reduce(self):
+        """
+        Reductions must keep the selected lags, in place or on a copy
+        """
+        x = np.random.uniform(0,10,(60,2))
+        v = Variogram(x, np.random.normal(0,1,60))
+        n = v.lags.size
+
+        new = v.reduce("abs", [1, 4], inplace = False)
+        keep = (v.lags >= 1) & (v.lags <= 4)
+        self.assertTrue(np.array_equal(new.lags, v.lags[keep]))
+        self.assertTrue(np.array_equal(new.diffs, v.diffs[keep]))
+        self.assertTrue(new.reduced and not v.reduced)
+
+        new = v.reduce("quant", [.1, .5], inplace = False)
+        self.assertTrue(abs(new.lags.size - .4*n) <= 2)
+
+        new = v.rreduce("frac", .25)
+        self.assertEqual(new.lags.size, int(.25*n))
+        self.assertTrue(np.all(np.isin(new.lags, v.lags)))
+
+        v.rreduce("abs", 100, inplace = True)
+        self.assertEqual(v.lags.size, 100)
+        self.assertTrue(v.reduced)
+
+    def test_workers(self):
+        """
+        Results must not depend on the number of worker threads
+        """
+        x = np.random.uniform(0,10,(300,2))
+        f = np.random.normal(0,1,(300,2))
+
+        for kw in [{}, {"stream" : True}, {"max_lag" : 3.},
+                {"max_lag" : 3., "stream" : True}, {"sample" : 5000}]:
+            kw.update(block = 2000, seed = 1)
+            a = Variogram(x, f, **kw)
+            b = Variogram(x, f, workers = 4, **kw)
+            if not a.stream:
+                self.assertTrue(np.array_equal(a.lags, b.lags))
+                self.assertTrue(np.array_equal(a.diffs, b.diffs))
+            for ra, rb in zip(a.matheron("auto", 9, True) +
+                    a.directional([0, 60], 30)[1:] + a.vmap(nbins = 6)[1:],
+                    b.matheron("auto", 9, True) +
+                    b.directional([0, 60], 30)[1:] + b.vmap(nbins = 6)[1:]):
+                self.assertTrue(np.allclose(ra, rb, equal_nan = True))
+
+    def test_append(self):
+        """
+        Appending observations must give the same estimate as a variogram
+        built from all points at once
+        """
+        x = np.random.uniform(0,10,(400,2))
+        f = np.random.normal(0,1,(400,3))
+
+        for kw in [{}, {"stream" : True, "block" : 3000}, {"max_lag" : 4.}]:
+            full = Variogram(x, f, **kw)
+            full.track("lin", [.5, 6, 12])
+            v = Variogram(x[:150], f[:150], **kw)
+            v.track("lin", [.5, 6, 12])
+            v.append(x[150:160], f[150:160])
+            v.append(x[160:], f[160:])
+
+            self.assertTrue(np.allclose(v.range, full.range))
+            for a, b in zip(v.tracked(True), full.tracked(True)):
+                self.assertTrue(np.allclose(a, b, equal_nan = True))
+            if not v.stream:
+                self.assertTrue(np.allclose(np.sort(v.lags),
+                    np.sort(full.lags)))
+                for a, b in zip(v.matheron("lin", [.5, 6, 12]),
+                        full.matheron("lin", [.5, 6, 12])):
+                    self.assertTrue(np.allclose(a, b, equal_nan = True))
+
+        v = Variogram(x[:150], f[:150], max_lag = 4.)
+        v.append(x[150:151], f[150:151])
+        lags = v.lags
+        v.append(x[151:152], f[151:152])
+        self.assertTrue(np.shares_memory(lags, v.lags))
+        r = v.reduce("abs", [v.range[0], 2], inplace = False)
+        w = copy.copy(v)
+        rlags, wlags = r.lags.copy(), w.lags.copy()
+        v.append(x[152:], f[152:])
+        w.append(x[152:160], f[152:160])
+        self.assertTrue(np.array_equal(r.lags, rlags))
+        self.assertTrue(np.array_equal(w.lags[:wlags.size], wlags))
+        full = Variogram(x, f, max_lag = 4.)
+        self.assertTrue(np.allclose(v.calc_lags(v.pairs), v.lags))
+        self.assertTrue(np.allclose(np.sort(v.lags), np.sort(full.lags)))
+
+    def test_bootstrap(self):
+        """
+        Bootstrap bands must bracket the estimate, be reproducible and not
+        depend on the number of workers or on streaming
+        """
+        x = np.random.uniform(0,10,(300,2))
+        f = np.random.normal(0,1,300)
+        v = Variogram(x, f)
+
+        c, m, lo, hi = v.bootstrap(100, "auto", 8, seed = 3)
+        self.assertTrue(np.allclose(m, v.matheron("auto", 8)[2]))
+        self.assertTrue(np.all((lo <= m) & (m <= hi) & (lo < hi)))
+
+        for other in [Variogram(x, f, workers = 3), Variogram(x, f,
+            stream = True, block = 1000)]:
+            for a, b in zip(other.bootstrap(100, "auto", 8, seed = 3),
+                    (c, m, lo, hi)):
+                self.assertTrue(np.allclose(a, b))
+
+        c, m, plo, phi = v.bootstrap(100, "auto", 8, groups = None, seed = 3)
+        self.assertTrue(np.all((plo <= m) & (m <= phi)))
+        self.assertTrue(np.allclose(plo, lo, rtol = .2))
+        self.assertTrue(np.allclose(phi, hi, rtol = .2))
+
+    def test_index(self):
+        """
+        Binning and lag windows from the sorted lag index must match those
+        from a full pass
+        """
+        x = np.random.uniform(0,10,(300,2))
+        f = np.random.normal(0,1,(300,2))
+        v = Variogram(x, f)
+        vi = Variogram(x, f, index = True)
+
+        for bt, b in [("auto", 11), ("lin", [1, 6, 8]),
+                ("bound", [-1, .5, 2, 4, 20])]:
+            for ra, ri in zip(v.matheron(bt, b, True),
+                    vi.matheron(bt, b, True)):
+                self.assertTrue(np.allclose(ra, ri, equal_nan = True))
+
+        for typ, bnds in [("abs", [1, 5]), ("quant", [.2, .7])]:
+            a = v.reduce(typ, bnds, inplace = False)
+            w = vi.reduce(typ, bnds, inplace = False)
+            self.assertTrue(np.allclose(np.sort(a.lags), w.lags))
+            self.assertTrue(np.allclose(a.range, w.range))
+            self.assertTrue(np.shares_memory(w.lags, vi.index[0]))
+            for ra, ri in zip(a.matheron("auto", 6, True),
+                    w.matheron("auto", 6, True)):
+                self.assertTrue(np.allclose(ra, ri, equal_nan = True))
+
+        self.assertTrue(vi.rreduce("frac", .5).index is None)
+
+    def test_reduce_pairs(self):
+        """
+        Directional passes and maps of reduced variograms must only walk the
+        remaining pairs
+        """
+        x = np.random.uniform(0,10,(120,2))
+        f = np.random.normal(0,1,120)
 
+        for kw in [{}, {"max_lag" : 5.}, {"index" : True}]:
+            v = Variogram(x[:100], f[:100], **kw)
+            v.append(x[100:], f[100:])
+            ii, jj = v.pair_ids(np.arange(v.lags.size))
+            self.assertTrue(np.allclose(v.lags, np.sqrt(np.sum((x[ii] -
+                x[jj])**2, axis = 1))))
 
+            r = v.reduce("abs", [v.range[0], 2], inplace = False)
+            m = r.matheron("bound", [0, 1, 2, 3])
+            d = r.directional([0], 90, "bound", [0, 1, 2, 3])
+            self.assertTrue(np.array_equal(m[1], d[1][:,0]))
+            self.assertEqual(d[1][2,0], 0)
+            self.assertEqual(r.vmap(lag = 3, nbins = 4)[1].sum(),
+                    2*r.lags.size)
 
+            s = v.rreduce("abs", 50)
+            self.assertEqual(s.directional([0], 90, "auto", 4)[1].sum(),
+                    np.sum(s.matheron("auto", 4)[1]))
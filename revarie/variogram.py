@@ -1,8 +1,12 @@
 import numpy as np
 from scipy.spatial.distance import pdist
-from numpy_indexed import group_by
+from scipy.spatial import cKDTree
 import functools
 import warnings
+import copy
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 from .fvariogram import fvariogram
 
@@ -13,7 +17,9 @@ class Variogram:
     performed with these quantities within this class.
 
     """
-    def __init__(self, x, f):
+    def __init__(self, x, f, stream = False, block = 2**20, max_lag = None,
+            sample = None, strata = None, seed = None, workers = 1,
+            index = False):
         """
         Create variogram and calculate lags and squared differences
 
@@ -23,7 +29,42 @@ class Variogram:
             Array of shape (m,n) where n is number of points in an
             m-dimensional domain
         f : numpy.ndarray
-            Array of field values observed at each of the n points.
+            Array of field values observed at each of the n points. An array
+            of shape (n,k) holds k fields observed at the same points, which
+            share lags and binning and give k variograms at once.
+        stream : bool
+            Set True to never store lags and squared differences. Point
+            pairs are instead walked in blocks whenever they are needed, so
+            memory is O(n + bins) and self.cloud is not available.
+        block : int
+            Approximate number of point pairs handled at once when streaming
+        max_lag : float
+            Largest lag of interest. If given, only point pairs at most
+            max_lag apart are enumerated with a KD-tree, so time and memory
+            scale with the number of nearby pairs instead of n^2. Pairs keep
+            the order they would have without max_lag. Automatic bins then
+            span (self.range[0], max_lag).
+        sample : int
+            Number of random point pairs to draw. If given, lags and squared
+            differences are only calculated for the drawn pairs, so time and
+            memory are O(sample) instead of O(n^2). Drawn pairs beyond
+            max_lag are dropped. Resulting Variogram objects are marked with
+            self.reduced = True.
+        strata : int, array-like
+            Stratify drawn pairs by lag. Either the number of equal width lag
+            classes or their boundaries. Candidate pairs are oversampled and
+            up to an equal share of sample is kept from every class, so short
+            lags are not crowded out by the far more numerous long ones.
+        seed : int, numpy.random.Generator
+            Seed or generator used to draw pairs
+        workers : int
+            Number of threads blocks of point pairs are processed on, None
+            uses the number of CPUs. Every block calculates its lags,
+            squared differences and bin sums locally and results are merged
+            in block order, so they do not depend on the number of workers.
+        index : bool
+            Set True to build the sorted lag index of self.build_index right
+            away
         """
         self.x = x
         self.f = f
@@ -31,14 +72,47 @@ class Variogram:
         self.check_init()
         self.cond_init()
 
-        self.s = f.size
+        self.s = self.f.shape[0]
+        self.dim = self.x.shape[1]
+        self.stream = stream
+        self.block = block
+        self.max_lag = max_lag
+        self.workers = (os.cpu_count() or 1) if workers is None else \
+                max(int(workers), 1)
+        self.tree = cKDTree(self.x) if max_lag is not None and \
+                sample is None else None
+        self.pairs = None
 
-        self.lags = self.calc_lags()
-        self.diffs = self.calc_diffs()
-
-        self.range = (np.min(self.lags), np.max(self.lags))
+        if sample is not None:
+            self.pairs = self.calc_sample(int(sample), strata,
+                    np.random.default_rng(seed))
+            self.lags = self.calc_lags(self.pairs)
+            self.diffs = self.calc_diffs(self.pairs)
+            self.range = (np.min(self.lags), np.max(self.lags)) \
+                    if self.lags.size > 0 else (0., 0.)
+        elif stream:
+            self.lags = None
+            self.diffs = None
+            self.range = self.calc_range()
+        else:
+            #pairs within max_lag are kept, all pairs are implicit in pdist
+            #order for the first self.n0 points
+            self.pairs = self.calc_pairs() if max_lag is not None else None
+            self.n0 = self.s
+            if self.workers > 1:
+                self.lags, self.diffs = self.fill_cloud(self.pairs)
+            else:
+                self.lags = self.calc_lags(self.pairs)
+                self.diffs = self.calc_diffs(self.pairs)
+            self.range = (np.min(self.lags), np.max(self.lags)) \
+                    if self.lags.size > 0 else (0., 0.)
 
-        self.reduced = False
+        self.reduced = sample is not None
+        self.acc = None
+        self.index = None
+        self.buffers = None
+        if index:
+            self.build_index()
 
     def cloud(self):
         """
@@ -51,32 +125,17 @@ class Variogram:
             Distance between all combinations of points fed into variogram.
         diffs : numpy.ndarray
             Squared difference between all combinations of field values fed
-            into variogram
+            into variogram, with one column per field if several were given
         """
+        if self.stream:
+            raise Exception("Lags and squared differences are not stored for"
+                    " streaming variograms")
         return self.lags, self.diffs
 
     def _c_matheron(f):
         @functools.wraps(f)
         def wrapper(self, bin_type = "auto", bins = 10, var = False):
-            if bin_type == "auto":
-                if not int(bins) == bins:
-                    raise Exception("Number of bins not correctly castable to"
-                            " int")
-            elif bin_type == "bound":
-                if not all(bins[i] <= bins[i+1] for i in range(len(bins)-1)):
-                    raise Exception("Bin boundaries must be arranged in"
-                                    " ascending order")
-            elif bin_type == "lin":
-                if bins[0] > bins[1]:
-                    raise Exception("Check format of 'bins' parameter, minima"
-                        " should be first element.")
-                if int(bins[2]) != bins[2]:
-                    raise Exception("Number of bins not correctly castable to"
-                            " int")
-            else:
-                raise Exception("Not known bin type, either auto, bound or li"
-                    "n.")
-
+            _check_bins(bin_type, bins)
             return f(self, bin_type, bins, var)
         return wrapper
 
@@ -92,9 +151,10 @@ class Variogram:
         bin_type : str
             Descriptor of the format of data passed into the bin parameter.
             Can be one of:
-                * "auto" : select bounds to be (0, self.range[1]/2), bin
-                    centers will be calculated accordingly based on user given
-                    number of bins.
+                * "auto" : select bounds to be (self.range[0],
+                    self.range[1]/2), or (self.range[0], self.max_lag) if
+                    max_lag was given, bin centers will be calculated
+                    accordingly based on user given number of bins.
                 * "lin" : bin boundaries will be linearly spaced based on a
                     user given minima, maxima and number of bins. Bin centers
                     will not fall on given maxima and minima.
@@ -119,28 +179,325 @@ class Variogram:
         n_bins : numpy.ndarray
             Number of point relations used to calculate each semivariance
         v : numpy.ndarray
-            Estimated semivariance values at lags corresponding to bin centers
+            Estimated semivariance values at lags corresponding to bin centers.
+            Of shape (bins,k) if k fields were given.
         v_var (optional) : numpy.ndarray
-            Variance associated with squared difference values within a bin
+            Variance associated with squared difference values within a bin,
+            shaped like v
         """
         bins = self.set_bins(bin_type, bins)
         centers = bins[:-1] + np.diff(bins,1)/2
 
         self.bbs = bins #bin boundaries
 
-        b_ind = np.digitize(self.lags, bins)
-        n_bins = np.bincount(b_ind-1)[:-1]
+        n_bins, s1, s2 = self.binstats(bins, var)
+        n = n_bins.reshape(n_bins.shape + (1,)*(s1.ndim - 1))
+        with np.errstate(divide = "ignore", invalid = "ignore"):
+            mean = s1/n
+            v = mean/2 #SEMI-variogram
 
-        gp = group_by(b_ind[np.where(b_ind != bins.size)])
-        _, v = gp.mean(self.diffs[np.where(b_ind != bins.size)])#account for lags bigger than bins
-        v = v/2 #SEMI-variogram
+            if var:
+                v_var = s2/n - mean**2
+                return centers, n_bins, v, v_var
+            else:
+                return centers, n_bins, v
 
-        if var:
-            _, v_var = gp.var(self.diffs[np.where(b_ind != bins.size)])#account for lags bigger than bins
-            return centers, n_bins, v, v_var
-        else:
-            return centers, n_bins, v
+    def binstats(self, bins, var = True):
+        """
+        Per-bin number of point pairs, sum and sum of squares of squared
+        differences for given bin boundaries. Lags outside of the bins are
+        ignored. Empty bins give nan estimates in self.matheron. Sums of
+        squares are None unless var is set.
+        """
+        nb = bins.size - 1
+        if self.index is not None:
+            pos = np.searchsorted(self.index[0], bins)
+            csum = lambda c : c[pos[1:]] - c[pos[:-1]]
+            return np.diff(pos), csum(self.index[2]), \
+                    csum(self.index[3]) if var else None
+        if not self.stream and self.workers == 1:
+            return _binsums(np.digitize(self.lags, bins), self.diffs, nb, var)
+
+        return self.sum_blocks(lambda lags, diffs : _binsums(np.digitize(lags,
+            bins), diffs, nb, var))
+
+    def _c_estimate(f):
+        @functools.wraps(f)
+        def wrapper(self, bin_type = "auto", bins = 10,
+                estimators = ("matheron", "cressie", "dowd")):
+            _check_bins(bin_type, bins)
+            estimators = (estimators,) if isinstance(estimators, str) else \
+                    tuple(estimators)
+            for e in estimators:
+                if e not in ("matheron", "cressie", "dowd"):
+                    raise Exception("'{f}' not recognized estimator, either "
+                            "matheron, cressie or dowd".format(f = e))
+            if self.stream and "dowd" in estimators:
+                raise Exception("Dowd estimator needs stored squared "
+                        "differences and is not available when streaming")
+            return f(self, bin_type, bins, estimators)
+        return wrapper
+
+    @_c_estimate
+    def estimate(self, bin_type = "auto", bins = 10,
+            estimators = ("matheron", "cressie", "dowd")):
+        """
+        *Calculate several variogram estimators with a shared binning of the
+        lags. Bins are assigned once and every estimator is reduced from the
+        same pass, so asking for several costs about the same as one.
 
+        Parameters
+        ----------
+        bin_type : str
+            Binning of lags, see self.matheron
+        bins : int, list, array-like
+            Binning of lags, see self.matheron
+        estimators : str, list
+            Any of:
+                * "matheron" : mean of squared differences
+                * "cressie" : Cressie-Hawkins estimator from the mean of
+                    square roots of absolute differences, robust to outliers
+                * "dowd" : Dowd estimator from the median of absolute
+                    differences, robust to outliers. Not available when
+                    streaming.
+
+        Returns
+        -------
+        centers : numpy.ndarray
+            Bin centers used for variogram
+        n_bins : numpy.ndarray
+            Number of point relations used to calculate each semivariance
+        v : dict
+            Estimated semivariance values at lags corresponding to bin
+            centers for every requested estimator
+        """
+        bins = self.set_bins(bin_type, bins)
+        centers = bins[:-1] + np.diff(bins,1)/2
+
+        self.bbs = bins #bin boundaries
+
+        n_bins, stats = self.estats(bins, estimators)
+        nd = next(iter(stats.values())).ndim
+        n = n_bins.reshape(n_bins.shape + (1,)*(nd - 1))
+
+        v = {}
+        with np.errstate(divide = "ignore", invalid = "ignore"):
+            if "matheron" in estimators:
+                v["matheron"] = stats["matheron"]/n/2
+            if "cressie" in estimators:
+                v["cressie"] = (stats["cressie"]/n)**4/(.914 + .988/n +
+                        .09/n**2)
+            if "dowd" in estimators:
+                v["dowd"] = 1.099*stats["dowd"]**2
+        return centers, n_bins, v
+
+    def estats(self, bins, estimators):
+        """
+        Per-bin number of point pairs and the reduction of squared
+        differences each estimator needs: their sum for Matheron, the sum of
+        their fourth roots for Cressie-Hawkins and the median of absolute
+        differences for Dowd.
+        """
+        nb = bins.size - 1
+
+        def sums(lags, diffs):
+            b_ind = np.digitize(lags, bins)
+            n, s1, _ = _binsums(b_ind, diffs, nb, False)
+            s4 = _binsums(b_ind, diffs**.25, nb, False)[1] \
+                    if "cressie" in estimators else None
+            return n, s1, s4
+
+        n, s1, s4 = self.sum_blocks(sums)
+        stats = {"matheron" : s1, "cressie" : s4}
+        if "dowd" in estimators:
+            stats["dowd"] = _binmedians(np.digitize(self.lags, bins),
+                    np.sqrt(self.diffs), nb)
+        return n, {e : stats[e] for e in estimators}
+
+    def _c_directional(f):
+        @functools.wraps(f)
+        def wrapper(self, dirs, tol = 22.5, bin_type = "auto", bins = 10,
+                var = False):
+            _check_bins(bin_type, bins)
+            if not 0 < tol <= 90:
+                raise Exception("Angular tolerance must be between 0 and 90 "
+                        "degrees")
+            dirs = np.asarray(dirs, dtype = np.float64)
+            if dirs.ndim > 2 or (dirs.ndim == 2 and dirs.shape[1] != 2):
+                raise Exception("Directions must be given as azimuths or as "
+                        "rows of (azimuth, dip)")
+            if self.dim not in (2, 3):
+                raise Exception("Directional variograms require a 2-D or 3-D"
+                        " domain")
+            if self.dim == 2 and dirs.ndim == 2 and \
+                    np.any(dirs[:,1] != 0):
+                raise Exception("Dip must be 0 in a 2-D domain")
+            return f(self, dirs, tol, bin_type, bins, var)
+        return wrapper
+
+    @_c_directional
+    def directional(self, dirs, tol = 22.5, bin_type = "auto", bins = 10,
+            var = False):
+        """
+        *Calculate Matheron variograms along several directions at once. A
+        point pair belongs to a direction if the angle between its lag
+        vector and the direction is at most tol, either way along the
+        direction. Bins of all directions are filled in a single pass over
+        the point pairs.
+
+        Parameters
+        ----------
+        dirs : float, list, array-like
+            Azimuth of each direction in degrees, counterclockwise from the
+            first axis in the plane of the first two axes. Rows of (azimuth,
+            dip) also give the dip in degrees from that plane towards the
+            third axis.
+        tol : float
+            Angular tolerance in degrees, 90 includes every pair in every
+            direction
+        bin_type : str
+            Binning of lags, see self.matheron
+        bins : int, list, array-like
+            Binning of lags, see self.matheron
+        var : bool
+            Set True for bin-wise variance to be calculated and returned
+
+        Returns
+        -------
+        centers : numpy.ndarray
+            Bin centers used for variogram
+        n_bins : numpy.ndarray
+            Number of point relations used in each bin, of shape
+            (bins,directions)
+        v : numpy.ndarray
+            Estimated semivariance values of shape (bins,directions), or
+            (bins,directions,k) if k fields were given
+        v_var (optional) : numpy.ndarray
+            Variance associated with squared difference values within a bin,
+            shaped like v
+        """
+        bins = self.set_bins(bin_type, bins)
+        centers = bins[:-1] + np.diff(bins,1)/2
+
+        self.bbs = bins #bin boundaries
+
+        dirs = dirs.reshape(-1, 2) if dirs.ndim == 2 else \
+                np.stack((dirs.ravel(), np.zeros(dirs.size)), axis = 1)
+        az, dip = np.radians(dirs).T
+        u = np.stack((np.cos(dip)*np.cos(az), np.cos(dip)*np.sin(az),
+            np.sin(dip)), axis = 1)[:,:self.dim]
+
+        n_bins, s1, s2 = [None if a is None else np.moveaxis(a, 0, 1) for a
+                in self.dirstats(bins, u, np.cos(np.radians(tol)), var)]
+        n = n_bins.reshape(n_bins.shape + (1,)*(s1.ndim - 2))
+        with np.errstate(divide = "ignore", invalid = "ignore"):
+            mean = s1/n
+            v = mean/2 #SEMI-variogram
+
+            if var:
+                return centers, n_bins, v, s2/n - mean**2
+            else:
+                return centers, n_bins, v
+
+    def dirstats(self, bins, u, cos_tol, var = True):
+        """
+        Per-direction and per-bin number of point pairs, sum and sum of
+        squares of squared differences in one blocked pass over the pairs.
+        Arrays are of shape (directions,bins) with a trailing axis for
+        several fields.
+        """
+        nb = bins.size - 1
+
+        def sums(ii, jj):
+            dx = self.x[ii] - self.x[jj]
+            lags = np.sqrt(np.sum(dx**2, axis = 1))
+            inside = np.abs(dx@u.T) >= cos_tol*lags[:,None]
+            inside[lags == 0] = False
+            p, d = np.nonzero(inside)
+
+            b_ind = d*(nb + 2) + np.digitize(lags[p], bins)
+            diffs = (self.f[ii[p]] - self.f[jj[p]])**2
+            return _binsums(b_ind, diffs, nb, var, groups = u.shape[0])
+
+        return self.sum_pairs(sums)
+
+    def vmap(self, lag = None, nbins = 21, var = False):
+        """
+        *Calculate the Matheron variogram map of a 2-D domain, the
+        semivariance binned by lag vector on a square grid of cells centered
+        on the zero lag. Every pair is counted at both h and -h, so the map
+        is symmetric.
+
+        Parameters
+        ----------
+        lag : float
+            Largest lag along each axis of the map, defaults to half of the
+            largest lag between points
+        nbins : int
+            Number of map cells along each axis
+        var : bool
+            Set True for the variance of squared differences in each map cell
+            to be calculated and returned
+
+        Returns
+        -------
+        edges : numpy.ndarray
+            Cell boundaries along both axes of the map
+        n : numpy.ndarray
+            Number of point pairs in each cell, of shape (nbins,nbins)
+        v : numpy.ndarray
+            Estimated semivariance in each cell, nan without pairs
+        v_var (optional) : numpy.ndarray
+            Variance associated with squared difference values in each cell
+        """
+        if self.dim != 2:
+            raise Exception("Variogram maps require a 2-D domain")
+        lag = self.range[1]/2 if lag is None else lag
+        edges = np.linspace(-lag, lag, int(nbins) + 1)
+        nb = edges.size - 1
+
+        def sums(ii, jj):
+            dx = self.x[ii] - self.x[jj]
+            cells = [np.digitize(np.concatenate((a, -a)), edges) for a in
+                    dx.T]
+            out = (cells[0] == 0) | (cells[0] > nb) | (cells[1] == 0) | \
+                    (cells[1] > nb)
+            b_ind = np.where(out, 0, (cells[0] - 1)*nb + cells[1])
+            diffs = (self.f[ii] - self.f[jj])**2
+            diffs = np.concatenate((diffs, diffs))
+            return _binsums(b_ind, diffs, nb*nb, var)
+
+        n, s1, s2 = [None if a is None else a.reshape((nb, nb) + a.shape[1:])
+                for a in self.sum_pairs(sums)]
+        m = n.reshape(n.shape + (1,)*(s1.ndim - 2))
+        with np.errstate(divide = "ignore", invalid = "ignore"):
+            mean = s1/m
+            if var:
+                return edges, n, mean/2, s2/m - mean**2
+            return edges, n, mean/2
+
+    def build_index(self):
+        """
+        *Sort stored lags once and keep cumulative sums of squared
+        differences and of their squares in lag order. Binning for
+        self.matheron and self.track and lag windows of self.reduce then
+        only search the sorted lags, in O(bins*log n) instead of a pass over
+        all pairs. Windows of self.reduce keep views of the index. Other
+        reductions and self.append drop it.
+
+        The index holds the sorted lags, the squared differences in lag
+        order, both cumulative sums with a leading zero and the sorting
+        permutation.
+        """
+        if self.stream:
+            raise Exception("Lags and squared differences are not stored for"
+                    " streaming variograms")
+        order = np.argsort(self.lags, kind = "stable")
+        diffs = self.diffs[order]
+        zero = np.zeros((1,) + diffs.shape[1:])
+        self.index = (self.lags[order], diffs,
+                np.concatenate((zero, np.cumsum(diffs, axis = 0))),
+                np.concatenate((zero, np.cumsum(diffs**2, axis = 0))), order)
 
     def set_bins(self, bin_type, bins):
         """
@@ -153,28 +510,523 @@ class Variogram:
         elif bin_type == "bound":
             return np.asarray(bins)
         elif bin_type == "auto":
-            return np.linspace(self.range[0],self.range[1]/2,int(bins)+1)
+            top = self.range[1]/2 if self.max_lag is None else self.max_lag
+            return np.linspace(self.range[0],top,int(bins)+1)
+
+    def iter_blocks(self, func = None):
+        """
+        Walks lags and squared differences in blocks of roughly self.block
+        pairs, in the same order as calc_lags and calc_diffs. Stored values
+        are sliced, streaming variograms calculate them from point pairs.
 
-    def calc_lags(self):
+        Parameters
+        ----------
+        func : function
+            Applied to the lags and squared differences of every block on
+            self.workers threads, results are yielded in block order
+
+        Yields
+        ------
+        lags : numpy.ndarray
+            Distances between the point pairs of the block
+        diffs : numpy.ndarray
+            Squared differences between field values of the block
+        """
+        func = (lambda lags, diffs : (lags, diffs)) if func is None else func
+        if not self.stream:
+            blocks = (slice(i, i + self.block) for i in range(0,
+                self.lags.size, self.block))
+            yield from _imap(lambda b : func(self.lags[b], self.diffs[b]),
+                    blocks, self.workers)
+            return
+
+        def block(pair):
+            ii, jj = pair
+            lags = np.sqrt(np.sum((self.x[ii] - self.x[jj])**2, axis = 1))
+            return func(lags, (self.f[ii] - self.f[jj])**2)
+        yield from _imap(block, self.iter_pairs(), self.workers)
+
+    def sum_blocks(self, func):
+        """
+        Sums the tuples of arrays returned by func for the lags and squared
+        differences of every block, see self.iter_blocks
+        """
+        empty = func(np.zeros(0), np.zeros((0,) + self.f.shape[1:]))
+        return _merge(empty, self.iter_blocks(func))
+
+    def sum_pairs(self, func):
+        """
+        Sums the tuples of arrays returned by func for the indices (i, j) of
+        every block of point pairs from self.iter_pairs, on self.workers
+        threads
+        """
+        empty = func(np.zeros(0, dtype = np.intp), np.zeros(0,
+            dtype = np.intp))
+        return _merge(empty, _imap(lambda p : func(*p), self.iter_pairs(),
+            self.workers))
+
+    def iter_pairs(self):
+        """
+        Walks the indices (i, j), i < j, of all point pairs in blocks of
+        whole rows of roughly self.block pairs. Only pairs within
+        self.max_lag are visited if it is set, only the drawn pairs in
+        sampled mode and only the remaining pairs after reductions.
+        """
+        if self.pairs is not None:
+            for i0 in range(0, self.pairs[0].size, self.block):
+                yield self.pairs[0][i0:i0 + self.block], \
+                        self.pairs[1][i0:i0 + self.block]
+            return
+        if self.max_lag is not None:
+            yield from self.iter_near_pairs()
+            return
+
+        n = self.s
+        rows = np.arange(n + 1)
+        before = rows*n - rows*(rows + 1)//2 #pairs before each row
+
+        i0 = 0
+        while i0 < n - 1:
+            i1 = int(np.searchsorted(before, before[i0] + self.block,
+                side = "right")) - 1
+            i1 = min(max(i1, i0 + 1), n)
+
+            counts = n - 1 - rows[i0:i1]
+            ii = np.repeat(rows[i0:i1], counts)
+            starts = np.repeat(before[i0:i1] - before[i0], counts)
+            jj = np.arange(ii.size) - starts + ii + 1
+
+            yield ii, jj
+            i0 = i1
+
+    def iter_near_pairs(self):
+        """
+        Walks the indices (i, j), i < j, of point pairs within self.max_lag
+        in blocks of whole rows. The number of rows per block adapts to the
+        local density of points to keep blocks near self.block pairs.
+        """
+        i0 = 0
+        rows = 1024
+        while i0 < self.s - 1:
+            i1 = min(i0 + rows, self.s)
+            near = cKDTree(self.x[i0:i1]).sparse_distance_matrix(self.tree,
+                    self.max_lag, output_type = "ndarray")
+            ii = near["i"].astype(np.intp) + i0
+            jj = near["j"].astype(np.intp)
+            keep = jj > ii
+            order = np.lexsort((jj[keep], ii[keep]))
+
+            yield ii[keep][order], jj[keep][order]
+            i0 = i1
+            rows = int(np.clip(rows*self.block/max(keep.sum(), 1), 1, 2**16))
+
+    def calc_pairs(self):
+        """
+        Indices (i, j), i < j, of all point pairs within self.max_lag in the
+        order of pdist
+        """
+        pairs = self.tree.query_pairs(self.max_lag, output_type = "ndarray")
+        order = np.lexsort((pairs[:,1], pairs[:,0]))
+        return pairs[order,0], pairs[order,1]
+
+    def calc_sample(self, m, strata, rng):
+        """
+        Draws indices (i, j), i < j, of m random point pairs, stratified by
+        lag if strata is given
+        """
+        size = m if strata is None else 4*m
+        ii = rng.integers(0, self.s, size)
+        jj = rng.integers(0, self.s - 1, size)
+        jj += jj >= ii #never pair a point with itself
+        ii, jj = np.minimum(ii, jj), np.maximum(ii, jj)
+
+        if self.max_lag is not None or strata is not None:
+            lags = np.sqrt(np.sum((self.x[ii] - self.x[jj])**2, axis = 1))
+        if self.max_lag is not None:
+            near = lags <= self.max_lag
+            ii, jj, lags = ii[near], jj[near], lags[near]
+        if strata is None:
+            return ii, jj
+
+        edges = np.asarray(strata, dtype = np.float64) if np.ndim(strata) \
+                else np.linspace(0, lags.max() if lags.size > 0 else 0,
+                        int(strata) + 1)
+        cls = np.clip(np.digitize(lags, edges), 1, edges.size - 1)
+        share = m//(edges.size - 1)
+
+        #candidates are in random order, so the first ones of a class are a
+        #random subset of it
+        order = np.argsort(cls, kind = "stable")
+        counts = np.bincount(cls, minlength = edges.size)
+        rank = np.arange(cls.size) - np.repeat(np.cumsum(counts) - counts,
+                counts)
+        keep = np.zeros(cls.size, dtype = bool)
+        keep[order[rank < share]] = True
+
+        fill = np.flatnonzero(~keep)[:max(m - keep.sum(), 0)]
+        keep[fill] = True
+        return ii[keep], jj[keep]
+
+    def calc_range(self):
+        """
+        Smallest and largest lag between points from a streaming pass
+        """
+        lo, hi = np.inf, -np.inf
+        for a, b in self.iter_blocks(lambda lags, _ : (lags.min(), lags.max())
+                if lags.size > 0 else (np.inf, -np.inf)):
+            lo, hi = min(lo, a), max(hi, b)
+        return (lo, hi) if lo <= hi else (0., 0.)
+
+    def fill_cloud(self, pairs = None):
+        """
+        Calculates lags and squared differences of all point pairs, or only
+        the given pairs, in blocks on self.workers threads. Blocks are
+        written straight into the output arrays at their offsets.
+        """
+        if pairs is None:
+            size = self.s*(self.s - 1)//2
+            blocks = self.iter_pairs()
+        else:
+            size = pairs[0].size
+            blocks = ((pairs[0][i:i + self.block], pairs[1][i:i +
+                self.block]) for i in range(0, size, self.block))
+
+        lags = np.empty(size)
+        diffs = np.empty((size,) + self.f.shape[1:])
+
+        def fill(item):
+            i0, (ii, jj) = item
+            i1 = i0 + ii.size
+            lags[i0:i1] = np.sqrt(np.sum((self.x[ii] - self.x[jj])**2,
+                axis = 1))
+            diffs[i0:i1] = (self.f[ii] - self.f[jj])**2
+
+        def offsets():
+            i0 = 0
+            for ii, jj in blocks:
+                yield i0, (ii, jj)
+                i0 += ii.size
+        for _ in _imap(fill, offsets(), self.workers):
+            pass
+        return lags, diffs
+
+    def calc_lags(self, pairs = None):
         """
         Upon initialization, calculates distances between all points given in
-        domain. Performed before any reductions are applied.
+        domain, or only those of the given pairs. Performed before any
+        reductions are applied.
         """
-        return pdist(self.x)
+        if pairs is None:
+            return pdist(self.x)
+        ii, jj = pairs
+        return np.sqrt(np.sum((self.x[ii] - self.x[jj])**2, axis = 1))
 
-    def calc_diffs(self):
+    def calc_diffs(self, pairs = None):
         """
         Upon initialization, calculates squared differences between all field
-        values given. Performed before any reductions are applied.
+        values given, or only those of the given pairs. Performed before any
+        reductions are applied.
         """
-        c_indx = np.mask_indices(self.s, np.triu, k=1)
+        if pairs is None:
+            c_indx = np.mask_indices(self.s, np.triu, k=1)
+        else:
+            c_indx = pairs
         diffs = (self.f[c_indx[0]] - self.f[c_indx[1]])**2
         return diffs
 
+    def _c_bootstrap(f):
+        @functools.wraps(f)
+        def wrapper(self, nboot = 200, bin_type = "auto", bins = 10,
+                level = .95, groups = 256, seed = None):
+            _check_bins(bin_type, bins)
+            if int(nboot) != nboot or nboot < 1:
+                raise Exception("Number of bootstrap replicates must be a "
+                        "positive int")
+            if not 0 < level < 1:
+                raise Exception("Confidence level must be between 0 and 1")
+            if groups is None and self.stream:
+                raise Exception("Pair-level bootstrap needs stored squared "
+                        "differences, give groups when streaming")
+            if groups is not None and (int(groups) != groups or groups < 1):
+                raise Exception("Number of groups must be a positive int")
+            return f(self, int(nboot), bin_type, bins, level, groups, seed)
+        return wrapper
+
+    @_c_bootstrap
+    def bootstrap(self, nboot = 200, bin_type = "auto", bins = 10,
+            level = .95, groups = 256, seed = None):
+        """
+        *Calculate bootstrap confidence bands of the Matheron variogram by
+        resampling point pairs with Poisson(1) weights. Pairs are assigned to
+        bins once. Within every bin, pairs are split into pseudo-random
+        groups whose sums are calculated in the same pass, and every
+        replicate only reweights groups, so hundreds of replicates cost
+        little more than one matheron call. Every replicate draws from its
+        own stream spawned from seed, so results do not depend on the number
+        of workers.
+
+        Parameters
+        ----------
+        nboot : int
+            Number of bootstrap replicates
+        bin_type : str
+            Binning of lags, see self.matheron
+        bins : int, list, array-like
+            Binning of lags, see self.matheron
+        level : float
+            Confidence level of the bands
+        groups : int
+            Number of resampled groups of pairs in every bin. None resamples
+            every pair on its own, at the cost of a pass over all pairs per
+            replicate. Not available when streaming.
+        seed : int, numpy.random.SeedSequence
+            Entropy used to spawn the stream of every replicate
+
+        Returns
+        -------
+        centers : numpy.ndarray
+            Bin centers used for variogram
+        v : numpy.ndarray
+            Estimated semivariance values at lags corresponding to bin centers
+        lo : numpy.ndarray
+            Lower end of the confidence band, shaped like v
+        hi : numpy.ndarray
+            Upper end of the confidence band, shaped like v
+        """
+        bins = self.set_bins(bin_type, bins)
+        centers = bins[:-1] + np.diff(bins,1)/2
+        nb = bins.size - 1
+
+        self.bbs = bins #bin boundaries
+
+        if groups is None:
+            b_ind = np.digitize(self.lags, bins)
+            draw = lambda rng : _binsums(b_ind, self.diffs, nb, False,
+                    weights = rng.poisson(1., b_ind.size))[:2]
+            n, s1, _ = _binsums(b_ind, self.diffs, nb, False)
+        else:
+            gn, gs1 = self.groupstats(bins, int(groups))
+            draw = lambda rng : _reweight(gn, gs1, rng.poisson(1., gn.shape))
+            n, s1 = gn.sum(axis = 0), gs1.sum(axis = 0)
+
+        if not isinstance(seed, np.random.SeedSequence):
+            seed = np.random.SeedSequence(seed)
+        reps = np.stack(list(_imap(lambda ss : _semivariance(*draw(
+            np.random.default_rng(ss))), seed.spawn(nboot), self.workers)))
+
+        q = 100*(1 - level)/2
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            lo, hi = np.nanpercentile(reps, [q, 100 - q], axis = 0)
+        return centers, _semivariance(n, s1), lo, hi
+
+    def groupstats(self, bins, groups):
+        """
+        Per-group and per-bin number of point pairs and sum of squared
+        differences, of shape (groups,bins) with a trailing axis for several
+        fields. Pairs are spread over groups by a hash of their position in
+        pdist order, or in the stored lags.
+        """
+        nb = bins.size - 1
+        group = lambda key : ((key.astype(np.uint64)*
+            np.uint64(0x9E3779B97F4A7C15)) >> np.uint64(33)) % \
+                    np.uint64(groups)
+
+        def sums(lags, diffs, key):
+            b_ind = group(key).astype(np.intp)*(nb + 2) + np.digitize(lags,
+                    bins)
+            return _binsums(b_ind, diffs, nb, False, groups = groups)[:2]
+
+        if not self.stream:
+            blocks = (slice(i, i + self.block) for i in range(0,
+                self.lags.size, self.block))
+            res = _imap(lambda b : sums(self.lags[b], self.diffs[b],
+                np.arange(b.start, min(b.stop, self.lags.size))), blocks,
+                self.workers)
+        else:
+            def block(pair):
+                ii, jj = pair
+                lags = np.sqrt(np.sum((self.x[ii] - self.x[jj])**2, axis = 1))
+                key = ii*self.s - ii*(ii + 1)//2 + jj - ii - 1
+                return sums(lags, (self.f[ii] - self.f[jj])**2, key)
+            res = _imap(block, self.iter_pairs(), self.workers)
+
+        empty = sums(np.zeros(0), np.zeros((0,) + self.f.shape[1:]),
+                np.zeros(0, dtype = np.intp))
+        return _merge(empty, res)
+
+    def track(self, bin_type = "auto", bins = 10):
+        """
+        *Start keeping running per-bin sums for the given binning, so that
+        self.tracked gives the current Matheron estimate at any time and
+        self.append folds only the pairs of new points into it. Bins stay
+        fixed once tracked, including automatic ones.
+
+        Parameters
+        ----------
+        bin_type : str
+            Binning of lags, see self.matheron
+        bins : int, list, array-like
+            Binning of lags, see self.matheron
+        """
+        _check_bins(bin_type, bins)
+        self.bbs = self.set_bins(bin_type, bins)
+        self.acc = list(self.binstats(self.bbs, True))
+
+    def tracked(self, var = False):
+        """
+        *Current Matheron estimate from the running sums started by
+        self.track, see self.matheron for the returned values
+        """
+        if self.acc is None:
+            raise Exception("No binning tracked, call track first")
+        centers = self.bbs[:-1] + np.diff(self.bbs,1)/2
+
+        n_bins, s1, s2 = self.acc
+        n = n_bins.reshape(n_bins.shape + (1,)*(s1.ndim - 1))
+        with np.errstate(divide = "ignore", invalid = "ignore"):
+            mean = s1/n
+            if var:
+                return centers, n_bins, mean/2, s2/n - mean**2
+            return centers, n_bins, mean/2
+
+    def _c_append(f):
+        @functools.wraps(f)
+        def wrapper(self, x_new, f_new):
+            x_new = np.asarray(x_new, dtype = np.float64)
+            f_new = np.asarray(f_new, dtype = np.float64)
+            x_new = x_new.reshape(x_new.size, 1) if x_new.ndim < 2 else x_new
+            if f_new.ndim > 1 and self.f.ndim == 1 and f_new.shape[1] == 1:
+                f_new = f_new.ravel()
+            if self.reduced:
+                raise Exception("Points can not be appended to reduced or "
+                        "sampled variograms")
+            if x_new.shape[1] != self.dim:
+                raise Exception("New points must have the dimension of the "
+                        "domain")
+            if x_new.shape[0] != f_new.shape[0] or \
+                    f_new.shape[1:] != self.f.shape[1:]:
+                raise Exception("New field values must match new points and "
+                        "the number of fields")
+            return f(self, x_new, f_new)
+        return wrapper
+
+    @_c_append
+    def append(self, x_new, f_new):
+        """
+        *Add observations to the variogram. Only pairs between new and old
+        points and among new points are calculated, so an update costs
+        O(n*m) for m new points. Pairs are folded into the running sums of
+        self.track if it was called, and appended to stored lags and
+        squared differences unless streaming. Stored pairs live in buffers
+        that grow by doubling, so existing pairs are only copied when a
+        buffer is outgrown.
+
+        Parameters
+        ----------
+        x_new : numpy.ndarray
+            Array of shape (m,n) of new points, one per row
+        f_new : numpy.ndarray
+            Field values observed at the new points, shaped like self.f
+            along all but the first axis
+        """
+        n_old = self.s
+        self.index = None
+        self.x = np.concatenate((self.x, x_new))
+        self.f = np.concatenate((self.f, f_new))
+        self.s = self.x.shape[0]
+        if self.max_lag is not None:
+            self.tree = cKDTree(self.x)
+
+        def block(pair):
+            ii, jj = pair
+            lags = np.sqrt(np.sum((self.x[ii] - self.x[jj])**2, axis = 1))
+            if self.max_lag is not None:
+                near = lags <= self.max_lag
+                ii, jj, lags = ii[near], jj[near], lags[near]
+            diffs = (self.f[ii] - self.f[jj])**2
+
+            sums = _binsums(np.digitize(lags, self.bbs), diffs,
+                    self.bbs.size - 1, True) if self.acc is not None else None
+            lo_hi = (lags.min(), lags.max()) if lags.size > 0 else None
+            return (lags, diffs, ii, jj) if not self.stream else None, sums, \
+                    lo_hi
+
+        new = []
+        lo, hi = self.range if n_old > 1 and self.range[1] > 0 else \
+                (np.inf, -np.inf)
+        for cloud, sums, lo_hi in _imap(block, self.iter_new_pairs(n_old),
+                self.workers):
+            if cloud is not None:
+                new.append(cloud)
+            if sums is not None:
+                self.acc = [a + b for a, b in zip(self.acc, sums)]
+            if lo_hi is not None:
+                lo, hi = min(lo, lo_hi[0]), max(hi, lo_hi[1])
+        self.range = (lo, hi) if lo <= hi else (0., 0.)
+
+        if not self.stream and new:
+            self.extend_cloud(new)
+
+    def extend_cloud(self, new):
+        """
+        Appends blocks of (lags, diffs, ii, jj) to the stored lags, squared
+        differences and pair indices. The stored arrays are views of the
+        used prefix of self.buffers, which are reallocated with doubled
+        capacity when outgrown, or when the stored arrays are no longer
+        views of buffers owned by this variogram (after a reduction or a
+        copy).
+        """
+        cols = [self.lags, self.diffs] + ([] if self.pairs is None else
+                list(self.pairs))
+        n = self.lags.shape[0]
+        m = sum(a[0].shape[0] for a in new)
+
+        owned = self.buffers is not None and self.buffers[0] == id(self) \
+                and len(self.buffers[1]) == len(cols) and all(c.base is b
+                and c.ctypes.data == b.ctypes.data for c, b in zip(cols,
+                    self.buffers[1]))
+        if not owned or self.buffers[1][0].shape[0] < n + m:
+            cap = max(2*(n + m), 1024)
+            bufs = [np.empty((cap,) + c.shape[1:], dtype = c.dtype)
+                    for c in cols]
+            for c, b in zip(cols, bufs):
+                b[:n] = c
+            self.buffers = (id(self), bufs)
+
+        bufs = self.buffers[1]
+        for a in new:
+            k = a[0].shape[0]
+            for c, b in zip(a, bufs):
+                b[n:n + k] = c
+            n += k
+
+        self.lags, self.diffs = bufs[0][:n], bufs[1][:n]
+        if self.pairs is not None:
+            self.pairs = (bufs[2][:n], bufs[3][:n])
+
+    def iter_new_pairs(self, n_old):
+        """
+        Walks the indices (i, j), i < j, of all point pairs with j at least
+        n_old in blocks of whole rows of roughly self.block pairs
+        """
+        j0 = n_old
+        while j0 < self.s:
+            j1 = min(j0 + max(self.block//max(j0, 1), 1), self.s)
+            counts = np.arange(j0, j1)
+            jj = np.repeat(counts, counts)
+            ii = np.arange(jj.size) - np.repeat(np.cumsum(counts) - counts,
+                    counts)
+            yield ii, jj
+            j0 = j1
+
     def _c_reduce(f):
         #bin order, bin type etc
         @functools.wraps(f)
-        def wrapper(self, typ, bnds, inplace):
+        def wrapper(self, typ, bnds, inplace = True):
+            if self.stream:
+                raise Exception("Lags and squared differences are not stored"
+                        " for streaming variograms")
             if bnds[0] > bnds [1]:
                 raise Exception("Lower and upper bounds out of order.")
             if typ == "abs":
@@ -183,10 +1035,10 @@ class Variogram:
                 if bnds[1] > self.range[1]:
                     warnings.warn("Upper bound greater than largest lag")
             elif typ == "quant":
-                if not 0 < all(bnds) < 1:
+                if not all(0 <= b <= 1 for b in bnds):
                     raise Exception("Quantile bounds must be between 0 and 1")
             else:
-                raise Exception("'{f}' not recognized bound type".fomat(f
+                raise Exception("'{f}' not recognized bound type".format(f
                     = typ))
 
             return f(self, typ, bnds, inplace)
@@ -234,17 +1086,27 @@ class Variogram:
         if typ  == "abs":
             min_lag = bnds[0]
             max_lag = bnds[1]
-        elif trim_type == "quant":
+        elif typ == "quant" and self.index is not None:
+            min_lag, max_lag = _sorted_quantile(self.index[0], bnds)
+        elif typ == "quant":
             min_lag = np.quantile(self.lags, bnds[0])
             max_lag = np.quantile(self.lags, bnds[1])
 
-        ids = np.where(min_lag <= self.lags <= max_lag)
-        self.rm_ids(ids, inplace)
+        if self.index is not None:
+            a = np.searchsorted(self.index[0], min_lag, side = "left")
+            b = np.searchsorted(self.index[0], max_lag, side = "right")
+            return self.rm_window(a, b, inplace)
+
+        ids = np.flatnonzero((min_lag <= self.lags) & (self.lags <= max_lag))
+        return self.rm_ids(ids, inplace)
 
 
     def _c_rreduce(f):
         @functools.wraps(f)
-        def wrapper(self, typ, amnt, inplace):
+        def wrapper(self, typ, amnt, inplace = False):
+            if self.stream:
+                raise Exception("Lags and squared differences are not stored"
+                        " for streaming variograms")
             if typ == "abs":
                 if not 0 < amnt < self.lags.size:
                     raise Exception("'amnt' not between 0 and size of"
@@ -301,29 +1163,76 @@ class Variogram:
         if typ == "abs":
             size = amnt
 
-        ids = np.choice(self.lags.size, size)
-        self.rm_ids(ids, inplace)
+        ids = np.sort(np.random.choice(self.lags.size, size, replace = False))
+        return self.rm_ids(ids, inplace)
 
+    def rm_ids(self, ids, inplace = False):
+        """
+        Helper function for reduction methods. Keeps the lags and squared
+        differences at ids, in place or on a shallow copy that shares points
+        and field values.
+        """
+        new = self if inplace else copy.copy(self)
+        new.pairs = self.pair_ids(ids)
+        new.lags = self.lags[ids]
+        new.diffs = self.diffs[ids]
+        new.range = (np.min(new.lags), np.max(new.lags)) \
+                if new.lags.size > 0 else (0., 0.)
+        new.reduced = True
+        new.index = None
+        new.buffers = None
 
+        if not inplace:
+            return new
 
-    def rm_ids(ids, inplace = False):
+    def rm_window(self, a, b, inplace = False):
         """
-        Helper function for reduction methods.
+        Helper function for reduction methods. Keeps the lags from a to b of
+        the sorted lag index, as views of the index. Lags and squared
+        differences end up in lag order.
         """
-        if inplace:
-            self.lags = self.lags[ids]
-            self.diffs = self.diffs[ids]
-            self.range = (np.min(self.lags), np.max(self.lags))
-            self.reduce = True
-        else:
-            new = Variogram(self.x, self.f)
-            new.lags = new.lags[ids]
-            new.diffs = new.diffs[ids]
-            new.range = (np.min(new.lags), np.max(new.lags))
-            new.reduce = True
+        lags, diffs, c1, c2, order = self.index
+        new = self if inplace else copy.copy(self)
+        new.pairs = self.pair_ids(order[a:b])
+        new.lags = lags[a:b]
+        new.diffs = diffs[a:b]
+        new.index = (lags[a:b], diffs[a:b], c1[a:b+1], c2[a:b+1],
+                np.arange(b - a))
+        new.range = (new.lags[0], new.lags[-1]) if b > a else (0., 0.)
+        new.reduced = True
+        new.buffers = None
 
+        if not inplace:
             return new
 
+    def pair_ids(self, ids):
+        """
+        Indices (i, j) of the point pairs of stored lags at positions ids.
+        Without kept pairs, stored lags are in pdist order for the first
+        self.n0 points followed by appended pairs ordered by j, then i.
+        """
+        ids = np.asarray(ids, dtype = np.intp)
+        if self.pairs is not None:
+            return self.pairs[0][ids], self.pairs[1][ids]
+
+        n = self.n0
+        rows = np.arange(n)
+        before = rows*n - rows*(rows + 1)//2 #pairs before each row
+        ii = np.empty_like(ids)
+        jj = np.empty_like(ids)
+
+        old = ids < n*(n - 1)//2
+        ii[old] = np.searchsorted(before, ids[old], side = "right") - 1
+        jj[old] = ids[old] - before[ii[old]] + ii[old] + 1
+
+        t = ids[~old] #appended pairs of column j start at j*(j - 1)/2
+        j = np.floor((1 + np.sqrt(1 + 8*t))/2).astype(np.intp)
+        j -= j*(j - 1)//2 > t
+        j += (j + 1)*j//2 <= t
+        jj[~old] = j
+        ii[~old] = t - j*(j - 1)//2
+        return ii, jj
+
     def check_init(self):
         """
         Notify user of errors during initialization of variogram
@@ -334,8 +1243,9 @@ class Variogram:
         if self.f.ndim > 1:
             if self.f.shape[1] == 1:
                 self.f = self.f.flatten()
-            else:
-                raise Exception("Field values data (f) should be 1D")
+            elif self.f.ndim > 2:
+                raise Exception("Field values data (f) should be 1D or 2D "
+                        "with one column per field")
         if self.x.ndim > 1:
             if self.x.shape[0] < self.x.shape[1]:
                 warnings.warn("Dimension of domain exceeds number of data"
@@ -355,3 +1265,132 @@ class Variogram:
         if self.x.ndim < 2:
             self.x = self.x.reshape(self.x.size,1)
 
+
+def _imap(func, items, workers):
+    """
+    Applies func to every item on a pool of worker threads and yields the
+    results in order. Only a few items per worker are in flight at once, so
+    items can be produced lazily.
+    """
+    if workers == 1:
+        yield from map(func, items)
+        return
+
+    with ThreadPoolExecutor(workers) as ex:
+        pending = deque()
+        for item in items:
+            pending.append(ex.submit(func, item))
+            if len(pending) >= 2*workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def _merge(first, results):
+    """
+    Sums tuples of arrays elementwise, None entries stay None
+    """
+    acc = list(first)
+    for res in results:
+        for i, a in enumerate(res):
+            if a is not None:
+                acc[i] = acc[i] + a
+    return tuple(acc)
+
+def _sorted_quantile(a, q):
+    """
+    Linearly interpolated quantiles of an already sorted array, as
+    np.quantile
+    """
+    pos = np.asarray(q, dtype = np.float64)*(a.size - 1)
+    lo = np.floor(pos).astype(np.intp)
+    hi = np.minimum(lo + 1, a.size - 1)
+    return a[lo] + (pos - lo)*(a[hi] - a[lo])
+
+def _reweight(n, s1, w):
+    """
+    Number of pairs and sum of squared differences per bin of a bootstrap
+    replicate from per-group sums and group weights of shape (groups,bins)
+    """
+    return np.sum(w*n, axis = 0), np.sum(w.reshape(w.shape +
+        (1,)*(s1.ndim - 2))*s1, axis = 0)
+
+def _semivariance(n, s1):
+    """
+    Matheron semivariance from the number of pairs and sum of squared
+    differences per bin, nan for empty bins
+    """
+    n = n.reshape(n.shape + (1,)*(s1.ndim - n.ndim))
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        return s1/n/2
+
+def _check_bins(bin_type, bins):
+    """
+    Notify user of badly formatted binning parameters, see
+    Variogram.matheron
+    """
+    if bin_type == "auto":
+        if not int(bins) == bins:
+            raise Exception("Number of bins not correctly castable to"
+                    " int")
+    elif bin_type == "bound":
+        if not all(bins[i] <= bins[i+1] for i in range(len(bins)-1)):
+            raise Exception("Bin boundaries must be arranged in"
+                            " ascending order")
+    elif bin_type == "lin":
+        if bins[0] > bins[1]:
+            raise Exception("Check format of 'bins' parameter, minima"
+                " should be first element.")
+        if int(bins[2]) != bins[2]:
+            raise Exception("Number of bins not correctly castable to"
+                    " int")
+    else:
+        raise Exception("Not known bin type, either auto, bound or li"
+            "n.")
+
+def _binmedians(b_ind, diffs, nb):
+    """
+    Median of diffs per bin from bin indices given by np.digitize, nan for
+    empty bins. Columns of 2-D diffs are treated separately.
+    """
+    inside = (b_ind > 0) & (b_ind <= nb)
+    b_ind, diffs = b_ind[inside], diffs[inside]
+    counts = np.bincount(b_ind, minlength = nb + 1)[1:]
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    lo = np.minimum(starts + (counts - 1)//2, max(b_ind.size - 1, 0))
+    hi = np.minimum(starts + counts//2, max(b_ind.size - 1, 0))
+
+    cols = diffs.reshape(diffs.shape[0], -1)
+    med = np.full((nb, cols.shape[1]), np.nan)
+    for c in range(cols.shape[1]):
+        ordered = cols[np.lexsort((cols[:,c], b_ind)), c]
+        if ordered.size > 0:
+            med[counts > 0, c] = ((ordered[lo] + ordered[hi])/2)[counts > 0]
+    return med.reshape((nb,) + diffs.shape[1:])
+
+def _binsums(b_ind, diffs, nb, var = True, groups = None, weights = None):
+    """
+    Number of pairs, sum and sum of squares of diffs per bin from bin
+    indices given by np.digitize, dropping those outside of the nb bins.
+    Columns of 2-D diffs are summed separately in a single bincount. Sums of
+    squares are only calculated if var is set. If groups is given, bin
+    indices are offset by group*(nb + 2) and sums have a leading group axis.
+    Pairs count weights times if given.
+    """
+    g = 1 if groups is None else groups
+    w = 1 if weights is None else weights.reshape((-1,) +
+            (1,)*(diffs.ndim - 1))
+    k = diffs.shape[1] if diffs.ndim > 1 else 1
+    idx = (b_ind[:,None]*k + np.arange(k)).ravel() if k > 1 else b_ind
+
+    crop = lambda a : a.reshape((g, -1) + a.shape[1:])[:,1:nb+1][0 if
+            groups is None else slice(None)]
+
+    n = crop(np.bincount(b_ind, weights = weights, minlength = g*(nb + 2)))
+    s1 = crop(np.bincount(idx, weights = (w*diffs).ravel(),
+        minlength = g*(nb + 2)*k).reshape((-1,) + diffs.shape[1:]))
+    if not var:
+        return n, s1, None
+
+    s2 = crop(np.bincount(idx, weights = (w*diffs**2).ravel(),
+        minlength = g*(nb + 2)*k).reshape((-1,) + diffs.shape[1:]))
+    return n, s1, s2
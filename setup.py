@@ -21,9 +21,13 @@ setup(
     classifiers=[
         "License :: OSI Approved :: MIT License",
         "Programming Language :: Python :: 3",
+        "Programming Language :: Python :: 3.5",
+        "Programming Language :: Python :: 3.6",
         "Programming Language :: Python :: 3.7",
+        "Programming Language :: Python :: 3.8",
     ],
     packages=find_packages(exclude=("tests",)),
     include_package_data=True,
-    install_requires=["numpy_indexed"],
+    python_requires=">=3.5",
+    install_requires=["numpy>=1.17", "scipy>=1.4"],
 )